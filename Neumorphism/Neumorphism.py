@@ -21,421 +21,2114 @@
 # SOFTWARE.
 
 
-try:
-    from PySide6 import (
-        QtWidgets,
-        QtCore,
-        QtGui
-    )
-except ImportError:
-    try:
-        from PySide2 import (
-            QtWidgets,
-            QtCore,
-            QtGui
-        )
-    except ImportError:
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import struct
+import hashlib
+import importlib
+import importlib.util
+import weakref
+import threading
+from collections import OrderedDict
+from functools import partial
+
+
+__version__ = "1.1.0"
+
+
+class _LazyModule:
+    # Imported on first use, so importing this module stays fast in
+    # processes that never render a shadow.
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._name)
+        globals()[self._name] = module
+        return getattr(module, attribute)
+
+
+numpy = _LazyModule("numpy") if importlib.util.find_spec("numpy") else None
+
+_QT_BINDINGS = ("PySide6", "PySide2", "PyQt6", "PyQt5")
+
+
+def _import_qt():
+    # QT_API selects a binding explicitly. Otherwise one the application
+    # already imported is reused, then the first one installed is taken.
+    requested = os.environ.get("QT_API", "").strip().lower()
+    if requested:
+        names = [name for name in _QT_BINDINGS if name.lower() == requested]
+        if not names:
+            raise ImportError(f"unsupported QT_API {requested!r}, expected "
+                              f"one of {', '.join(_QT_BINDINGS)}")
+    else:
+        names = sorted(_QT_BINDINGS, key=lambda name: name not in sys.modules)
+
+    errors = []
+    for name in names:
+        try:
+            return (name,) + tuple(importlib.import_module(f"{name}.{module}")
+                                   for module in ("QtWidgets", "QtCore",
+                                                  "QtGui"))
+        except ImportError as error:
+            errors.append(f"{name}: {error}")
+    raise ImportError("Neumorphism needs one of "
+                      f"{', '.join(_QT_BINDINGS)} ({'; '.join(errors)})")
+
+
+_qt_binding, QtWidgets, QtCore, QtGui = _import_qt()
+
+if _qt_binding.startswith("PyQt"):
+    _Signal = QtCore.pyqtSignal
+
+    def _source_pixmap(effect: QtWidgets.QGraphicsEffect, system):
+        # PyQt returns the offset of the pixmap along with it.
+        return effect.sourcePixmap(system)[0]
+else:
+    _Signal = QtCore.Signal
+
+    def _source_pixmap(effect: QtWidgets.QGraphicsEffect, system):
+        return effect.sourcePixmap(system)
+
+
+def qt_binding():
+    return _qt_binding
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_null_stage = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler, name: str):
+        self._profiler = profiler
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self._profiler.record(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class ShadowProfiler:
+    # Opt-in timings and counters of the shadow pipeline. While disabled
+    # every hook returns after a single attribute check.
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._callback = None
+        self._frame_start = 0.0
+        self.reset()
+
+    def setEnabled(self, enabled: bool):
+        self.enabled = enabled
+
+    def setCallback(self, callback=None):
+        # Called with the stage durations (ms) of every finished frame.
+        self._callback = callback
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _null_stage
+        return _Stage(self, name)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = [0, 0.0, 0.0]
+            stage[0] += 1
+            stage[1] += seconds
+            stage[2] = max(stage[2], seconds)
+            self._frame[name] = self._frame.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def beginFrame(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._frame = {}
+        self._frame_start = time.perf_counter()
+
+    def endFrame(self):
+        if not self.enabled:
+            return
+        self.record("draw", time.perf_counter() - self._frame_start)
+        with self._lock:
+            self.frames += 1
+            self._last_frame = {name: seconds * 1000
+                                for name, seconds in self._frame.items()}
+            last_frame = self._last_frame
+        if self._callback is not None:
+            self._callback(last_frame)
+
+    def snapshot(self):
+        with self._lock:
+            stages = {name: {"calls": calls, "total_ms": total * 1000,
+                             "max_ms": longest * 1000,
+                             "last_frame_ms": self._last_frame.get(name, 0.0)}
+                      for name, (calls, total, longest)
+                      in self._stages.items()}
+            return {"enabled": self.enabled, "frames": self.frames,
+                    "stages": stages, "counters": dict(self._counters),
+                    "atlas": shadow_atlas.stats(),
+                    "disk": shadow_disk_cache.stats(),
+                    "scheduler": shadow_scheduler.stats()}
+
+    def dump(self, path: str = None):
+        data = json.dumps(self.snapshot(), indent=2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(data)
+        return data
+
+    def reset(self):
+        with self._lock:
+            self.frames = 0
+            self._stages = {}
+            self._counters = {}
+            self._frame = {}
+            self._last_frame = {}
+
+
+shadow_profiler = ShadowProfiler()
+
+
+def _image_bytes(image: QtGui.QImage):
+    bits = image.constBits()
+    if hasattr(bits, "setsize"):
+        bits.setsize(image.sizeInBytes())
+    return bytes(bits)
+
+
+def _image_array(image: QtGui.QImage):
+    # Writable view of the pixels of an 8 or 32-bit image, no copy is made.
+    bits = image.bits()
+    if hasattr(bits, "setsize"):
+        bits.setsize(image.sizeInBytes())
+    channels = image.depth() // 8
+    array = numpy.frombuffer(bits, numpy.uint8).reshape(
+            image.height(), image.bytesPerLine())
+    return array[:, :image.width() * channels].reshape(
+            image.height(), image.width(), channels)
+
+
+def _scene_blur(image: QtGui.QImage, blur_radius):
+    w, h = image.width(), image.height()
+
+    effect = QtWidgets.QGraphicsBlurEffect(blurRadius=blur_radius)
+
+    scene = QtWidgets.QGraphicsScene()
+    item = QtWidgets.QGraphicsPixmapItem()
+    item.setPixmap(QtGui.QPixmap.fromImage(image))
+    item.setGraphicsEffect(effect)
+    scene.addItem(item)
+
+    res = QtGui.QImage(QtCore.QSize(w, h),
+                       QtGui.QImage.Format.Format_ARGB32)
+    res.fill(QtCore.Qt.GlobalColor.transparent)
+
+    ptr = QtGui.QPainter(res)
+    ptr.setRenderHints(
+            QtGui.QPainter.RenderHint.Antialiasing |
+            QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+    scene.render(ptr, QtCore.QRectF(), QtCore.QRectF(0, 0, w, h))
+    ptr.end()
+
+    return res
+
+
+# Gaussian sigma that matches the look of QGraphicsBlurEffect for a radius.
+_BLUR_SIGMA_SCALE = 0.6
+
+
+def _box_radii(sigma, passes: int = 3):
+    ideal = (12 * sigma * sigma / passes + 1) ** 0.5
+    lower = int(ideal)
+    if lower % 2 == 0:
+        lower -= 1
+    upper = lower + 2
+    m = round((12 * sigma * sigma - passes * lower * lower
+               - 4 * passes * lower - 3 * passes) / (-4 * lower - 4))
+    return [(lower if i < m else upper) // 2 for i in range(passes)]
+
+
+def _box_blur_rows(data, radii):
+    # Repeated box filters along the first axis using running sums.
+    n = data.shape[0]
+    for radius in radii:
+        if radius <= 0:
+            continue
+        size = radius * 2 + 1
+        summed = numpy.zeros((n + size,) + data.shape[1:], numpy.float32)
+        numpy.cumsum(data, axis=0, out=summed[radius + 1:radius + 1 + n])
+        summed[radius + 1 + n:] = summed[radius + n]
+        data = summed[size:]
+        data -= summed[:-size]
+        data *= 1 / size
+    return data
+
+
+def _numpy_blur(image: QtGui.QImage, blur_radius):
+    if image.format() != QtGui.QImage.Format.Format_Alpha8:
+        image = image.convertToFormat(
+                QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    else:
+        image = image.copy()
+    w, h = image.width(), image.height()
+    pixels = _image_array(image)
+
+    data = pixels.astype(numpy.float32)
+    scale = 1
+    # Like Qt, large radii are blurred at half resolution and scaled back,
+    # which a wide blur hides.
+    if blur_radius >= 4 and w >= 2 and h >= 2:
+        data = numpy.pad(data, ((0, h % 2), (0, w % 2), (0, 0)))
+        data = (data[0::2, 0::2] + data[1::2, 0::2]
+                + data[0::2, 1::2] + data[1::2, 1::2]) * 0.25
+        scale = 2
+
+    radii = _box_radii(blur_radius * _BLUR_SIGMA_SCALE / scale)
+    data = _box_blur_rows(data, radii)
+    data = _box_blur_rows(numpy.ascontiguousarray(
+            data.transpose(1, 0, 2)), radii).transpose(1, 0, 2)
+
+    if scale == 1:
+        pixels[...] = numpy.rint(data)
+        return image
+
+    small = QtGui.QImage(data.shape[1], data.shape[0], image.format())
+    _image_array(small)[...] = numpy.rint(data)
+    return small.scaled(small.width() * 2, small.height() * 2,
+                        QtCore.Qt.AspectRatioMode.IgnoreAspectRatio,
+                        QtCore.Qt.TransformationMode.SmoothTransformation
+                        ).copy(0, 0, w, h)
+
+
+# name -> (function, whether it may run outside the GUI thread)
+_blur_backends = {"scene": (_scene_blur, False)}
+if numpy is not None:
+    _blur_backends["numpy"] = (_numpy_blur, True)
+
+_blur_backend = "scene"
+
+
+def register_blur_backend(name: str, function, thread_safe: bool = False):
+    _blur_backends[name] = (function, thread_safe)
+
+
+def set_blur_backend(name: str):
+    global _blur_backend
+    if name not in _blur_backends:
+        raise ValueError(f"unknown blur backend: {name!r}")
+    _blur_backend = name
+
+
+def blur_backend():
+    return _blur_backend
+
+
+def blur_image(image: QtGui.QImage, blur_radius, backend=None):
+    # backend is a blur function, by default the one of the current
+    # backend.
+    if backend is None:
+        backend = _blur_backends[_blur_backend][0]
+    shadow_profiler.count("pixels_blurred", image.width() * image.height())
+    with shadow_profiler.stage("blur"):
+        return backend(image, blur_radius)
+
+
+def _alpha_rows(image: QtGui.QImage):
+    # Scanlines are padded to 32 bits and the padding is not initialized.
+    data = _image_bytes(image)
+    bpl, w = image.bytesPerLine(), image.width()
+    return [data[i * bpl:i * bpl + w] for i in range(image.height())]
+
+
+def _alpha_hash(image: QtGui.QImage):
+    # Shadows depend only on the coverage of the source, so hover and focus
+    # repaints that change colors but not the shape still hit the cache.
+    alpha = hashlib.blake2b(digest_size=16)
+    for row in _alpha_rows(image):
+        alpha.update(row)
+    return alpha.digest()
+
+
+def _alpha_array(image: QtGui.QImage):
+    # Read-only (h, w) view of an Alpha8 image.
+    bits = image.constBits()
+    if hasattr(bits, "setsize"):
+        bits.setsize(image.sizeInBytes())
+    return numpy.frombuffer(bits, numpy.uint8).reshape(
+            image.height(), image.bytesPerLine())[:, :image.width()]
+
+
+def _alpha8_image(alpha):
+    shadow_profiler.count("images")
+    image = QtGui.QImage(alpha.shape[1], alpha.shape[0],
+                         QtGui.QImage.Format.Format_Alpha8)
+    _image_array(image)[..., 0] = alpha
+    return image
+
+
+def _whole_shifted_alpha(alpha, dx: int, dy: int):
+    # Coverage moved by a whole-pixel offset; uncovered pixels are empty.
+    h, w = alpha.shape
+    shifted = numpy.zeros_like(alpha)
+    if abs(dx) < w and abs(dy) < h:
+        shifted[max(dy, 0):h + min(dy, 0), max(dx, 0):w + min(dx, 0)] = \
+            alpha[max(-dy, 0):h + min(-dy, 0), max(-dx, 0):w + min(-dx, 0)]
+    return shifted
+
+
+def _shifted_alpha(alpha, offset):
+    # Fractional offsets, left by a fractional device pixel ratio or a
+    # reduced resolution, mix the neighbouring whole-pixel shifts as a
+    # bilinear drawImage() would.
+    dx, dy = math.floor(offset[0]), math.floor(offset[1])
+    fx, fy = offset[0] - dx, offset[1] - dy
+    if not fx and not fy:
+        return _whole_shifted_alpha(alpha, dx, dy)
+    shifted = numpy.zeros(alpha.shape, numpy.float32)
+    for x, weight_x in ((dx, 1 - fx), (dx + 1, fx)):
+        for y, weight_y in ((dy, 1 - fy), (dy + 1, fy)):
+            if weight_x * weight_y:
+                shifted += (_whole_shifted_alpha(alpha, x, y)
+                            * numpy.float32(weight_x * weight_y))
+    return numpy.rint(shifted).astype(numpy.uint8)
+
+
+def _alpha_multiply(alpha, factor):
+    return ((alpha.astype(numpy.uint16) * factor + 127) // 255
+            ).astype(numpy.uint8)
+
+
+def _alpha_over(bottom, top):
+    return top + _alpha_multiply(bottom, 255 - top)
+
+
+def _tinted_image(alpha, premultiplied: int):
+    # ARGB32 premultiplied image of a premultiplied color with the
+    # given coverage.
+    shadow_profiler.count("images")
+    h, w = alpha.shape
+    image = QtGui.QImage(w, h,
+                         QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    bits = image.bits()
+    if hasattr(bits, "setsize"):
+        bits.setsize(image.sizeInBytes())
+    pixels = numpy.frombuffer(bits, numpy.uint32).reshape(
+            h, image.bytesPerLine() // 4)[:, :w]
+
+    # Every coverage value maps to one pixel, so tinting is a table lookup.
+    coverage = numpy.arange(256, dtype=numpy.uint32)
+    table = numpy.zeros(256, numpy.uint32)
+    for shift in (24, 16, 8, 0):
+        channel = premultiplied >> shift & 0xFF
+        table |= (coverage * channel + 127) // 255 << shift
+    numpy.take(table, alpha, out=pixels, mode="clip")
+    return image
+
+
+def _uniform_band(image: QtGui.QImage):
+    # Range of rows around the middle that are identical to it.
+    rows = _alpha_rows(image)
+    center = len(rows) // 2
+    start, end = center, center + 1
+    while start > 0 and rows[start - 1] == rows[center]:
+        start -= 1
+    while end < len(rows) and rows[end] == rows[center]:
+        end += 1
+    return start, end
+
+
+def _nine_patch_axis(length, band, reach):
+    start, end = band
+    if start + reach + 1 >= end - reach:
+        return [(0, length, 0)], (0, 0)
+    low = start + reach + 1
+    high = length - (end - reach)
+    return [(0, low, 0), (length - high, high, low)], (low - 1, high)
+
+
+def _nine_patch_source(context, reach: int):
+    # Drops the uniform middle of the shape, keeping the corners, the
+    # reach of the shadows into the straight edges and one row and column
+    # to stretch back over.
+    source, alpha = context.image(), context.alpha()
+    transposed = alpha.transformed(QtGui.QTransform(0, 1, 1, 0, 0, 0))
+    columns, (left, right) = _nine_patch_axis(
+            source.width(), _uniform_band(transposed), reach)
+    rows, (top, bottom) = _nine_patch_axis(
+            source.height(), _uniform_band(alpha), reach)
+    if len(columns) == 1 and len(rows) == 1:
+        return context, None
+
+    shadow_profiler.count("images")
+    shadow_profiler.count("painters")
+    proxy = QtGui.QImage(sum(part[1] for part in columns),
+                         sum(part[1] for part in rows),
+                         QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    proxy.fill(QtCore.Qt.GlobalColor.transparent)
+    painter = QtGui.QPainter(proxy)
+    painter.setCompositionMode(
+            QtGui.QPainter.CompositionMode.CompositionMode_Source)
+    for sx, sw, tx in columns:
+        for sy, sh, ty in rows:
+            painter.drawImage(tx, ty, source, sx, sy, sw, sh)
+    painter.end()
+
+    return (_RenderContext(proxy, dpr=context.dpr),
+            (left, top, right, bottom))
+
+
+class _RenderContext:
+    # The shape one frame's shadows are cast by. The image, its alpha
+    # channel and masks are derived at most once and shared by every stage
+    # and layer. The source is a QPixmap, a QImage or a callable returning
+    # one; image() must first be called on the GUI thread if it is a
+    # QPixmap.
+    __slots__ = ("_source", "rect", "dpr", "clip", "_image", "_alpha",
+                 "_inverted_alpha", "_masks")
+
+    def __init__(self, source, rect: QtCore.QRect = None, dpr: float = 1):
+        self._source = source
+        # Where the source is drawn, in painter units of dpr pixels each.
+        self.rect = rect
+        self.dpr = dpr
+        # Whether shadows are cut to the shape; see scaled().
+        self.clip = True
+        self._image = None
+        self._alpha = None
+        self._inverted_alpha = None
+        self._masks = {}
+
+    def image(self):
+        if self._image is None:
+            source = self._source
+            if callable(source):
+                source = source()
+            if isinstance(source, QtGui.QPixmap):
+                source = source.toImage()
+            self._image = source.convertToFormat(
+                    QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+            # The pipeline works in pixels of the source.
+            self._image.setDevicePixelRatio(1)
+            self._source = None
+        return self._image
+
+    def alpha(self):
+        if self._alpha is None:
+            self._alpha = self.image().convertToFormat(
+                    QtGui.QImage.Format.Format_Alpha8)
+        return self._alpha
+
+    def alphaArray(self):
+        return _alpha_array(self.alpha())
+
+    def invertedAlpha(self):
+        if self._inverted_alpha is None:
+            if numpy is not None:
+                self._inverted_alpha = _alpha8_image(255 - self.alphaArray())
+            else:
+                shadow_profiler.count("images")
+                self._inverted_alpha = self.alpha().copy()
+                self._inverted_alpha.invertPixels(
+                        QtGui.QImage.InvertMode.InvertRgba)
+        return self._inverted_alpha
+
+    def scaled(self, scale: float):
+        # The shape at a reduced resolution. Shadows rendered from it are
+        # not cut to the shape, that is done after scaling them back.
+        image = self.image()
+        shadow_profiler.count("images")
+        context = _RenderContext(image.scaled(
+                max(1, round(image.width() * scale)),
+                max(1, round(image.height() * scale)),
+                QtCore.Qt.AspectRatioMode.IgnoreAspectRatio,
+                QtCore.Qt.TransformationMode.SmoothTransformation),
+                dpr=self.dpr * scale)
+        context.clip = False
+        return context
+
+    def clipShadow(self, image: QtGui.QImage, inside: bool):
+        # Scales a shadow rendered from scaled() back to the source size
+        # and cuts it to the shape.
+        shadow_profiler.count("images")
+        shadow_profiler.count("painters")
+        shadow = QtGui.QImage(self.image().size(),
+                              QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        shadow.fill(QtCore.Qt.GlobalColor.transparent)
+        painter = QtGui.QPainter(shadow)
+        painter.setRenderHint(
+                QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+        painter.drawImage(shadow.rect(), image)
+        painter.setCompositionMode(
+                QtGui.QPainter.CompositionMode.CompositionMode_DestinationIn)
+        painter.drawImage(0, 0, self.alpha() if inside
+                          else self.invertedAlpha())
+        painter.end()
+        return shadow
+
+    def mask(self, inside: bool = True):
+        # 1-bit image of the opaque (or transparent) part of the source.
+        # Its second color is the tint it is drawn with, so every caller
+        # gets its own copy to recolor.
+        mask = self._masks.get(inside)
+        if mask is None:
+            shadow_profiler.count("images")
+            with shadow_profiler.stage("mask"):
+                mask = self.image().createMaskFromColor(
+                        0, QtCore.Qt.MaskMode.MaskOutColor if inside
+                        else QtCore.Qt.MaskMode.MaskInColor)
+            mask.setColorTable([0, 0xFF000000])
+            self._masks[inside] = mask
+        return QtGui.QImage(mask)
+
+
+class ShadowSpec:
+    __slots__ = ("inside", "offset", "blur", "rgba",
+                 "premultiplied", "extent", "sides", "key", "_hash")
+
+    def __init__(self, inside: bool, offset: tuple[float, float],
+                 blur: float, color):
+        if len(offset) != 2:
+            raise ValueError(f"shadow offset must be [x, y]: {offset!r}")
+        if blur < 0:
+            raise ValueError(f"shadow blur must not be negative: {blur!r}")
+        parsed = QtGui.QColor(color)
+        if not parsed.isValid():
+            raise ValueError(f"invalid shadow color: {color!r}")
+        color = parsed
+
+        alpha = color.alpha()
+        offset = (offset[0], offset[1])
+        key = (bool(inside), offset[0], offset[1], blur, color.rgba())
+        values = {
+            "inside": bool(inside),
+            "offset": offset,
+            "blur": blur,
+            "rgba": color.rgba(),
+            "premultiplied": alpha << 24
+                             | color.red() * alpha // 255 << 16
+                             | color.green() * alpha // 255 << 8
+                             | color.blue() * alpha // 255,
+            "extent": (abs(offset[0]) + blur * 2, abs(offset[1]) + blur * 2),
+            # How far the shadow reaches past each side of the shape.
+            "sides": (max(0, blur * 2 - offset[0]),
+                      max(0, blur * 2 - offset[1]),
+                      max(0, blur * 2 + offset[0]),
+                      max(0, blur * 2 + offset[1])),
+            "key": key,
+            "_hash": hash(key),
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def fromDict(cls, shadow: dict):
+        if "outside" not in shadow.keys() and "inside" not in shadow.keys():
+            raise ValueError(
+                    f"shadow must be marked outside or inside: {shadow!r}")
+        try:
+            return cls("inside" in shadow.keys(), shadow["offset"],
+                       shadow["blur"], shadow["color"])
+        except KeyError as error:
+            raise ValueError(
+                    f"shadow is missing {error.args[0]!r}: {shadow!r}")
+
+    @property
+    def color(self):
+        # Only the rgba value is kept, a QColor could be changed in place.
+        return QtGui.QColor.fromRgba(self.rgba)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ShadowSpec is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, ShadowSpec):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return (f"ShadowSpec(inside={self.inside}, offset={self.offset}, "
+                f"blur={self.blur}, color=#{self.rgba:08x})")
+
+
+def _compile_shadow_list(shadow_list):
+    specs = []
+    for shadow in shadow_list:
+        if isinstance(shadow, ShadowSpec):
+            specs.append(shadow)
+        elif "outside" in shadow.keys() and "inside" in shadow.keys():
+            specs.append(ShadowSpec(False, shadow["offset"], shadow["blur"],
+                                    shadow["color"]))
+            specs.append(ShadowSpec(True, shadow["offset"], shadow["blur"],
+                                    shadow["color"]))
+        else:
+            specs.append(ShadowSpec.fromDict(shadow))
+    return tuple(specs)
+
+
+def _shadow_extents(shadow_list: tuple):
+    # How far the outside shadows reach past each side of the shape.
+    extents = [0, 0, 0, 0]
+    for shadow in shadow_list:
+        if not shadow.inside:
+            extents = [max(extent, side) for extent, side
+                       in zip(extents, shadow.sides)]
+    return tuple(extents)
+
+
+def _scaled_shadow_list(shadow_list: tuple, scale: float):
+    # The shadows in pixels of a device or image with scale pixels per
+    # unit.
+    if scale == 1:
+        return shadow_list
+    return tuple(ShadowSpec(shadow.inside, (shadow.offset[0] * scale,
+                                            shadow.offset[1] * scale),
+                            shadow.blur * scale, shadow.color)
+                 for shadow in shadow_list)
+
+
+# Blur radii an animation passes through between two radii, so the shape
+# is blurred only this many times and the frames in between are tinted and
+# offset copies.
+_ANIMATION_BLUR_LEVELS = 4
+
+
+def _interpolated_color(start: QtGui.QColor, end: QtGui.QColor, t: float):
+    return QtGui.QColor(*(round(a + (b - a) * t) for a, b
+                          in zip(start.getRgb(), end.getRgb())))
+
+
+def _interpolated_shadow_list(start: tuple, end: tuple, t: float):
+    # Outside and inside shadows are paired by their position in the
+    # lists; a shadow without a partner fades in or out.
+    shadows = []
+    for inside in (False, True):
+        starts = [shadow for shadow in start if shadow.inside == inside]
+        ends = [shadow for shadow in end if shadow.inside == inside]
+        for index in range(max(len(starts), len(ends))):
+            a = starts[index] if index < len(starts) else None
+            b = ends[index] if index < len(ends) else None
+            if a is None:
+                a = ShadowSpec(inside, b.offset, b.blur,
+                               QtGui.QColor(b.color.red(), b.color.green(),
+                                            b.color.blue(), 0))
+            if b is None:
+                b = ShadowSpec(inside, a.offset, a.blur,
+                               QtGui.QColor(a.color.red(), a.color.green(),
+                                            a.color.blue(), 0))
+            level = (round(t * (_ANIMATION_BLUR_LEVELS - 1))
+                     / (_ANIMATION_BLUR_LEVELS - 1))
+            shadows.append(ShadowSpec(
+                    inside,
+                    (a.offset[0] + (b.offset[0] - a.offset[0]) * t,
+                     a.offset[1] + (b.offset[1] - a.offset[1]) * t),
+                    a.blur + (b.blur - a.blur) * level,
+                    _interpolated_color(a.color, b.color, t)))
+    return tuple(shadows)
+
+
+def _pixmap_bytes(pixmap: QtGui.QPixmap):
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class ShadowAtlas:
+    def __init__(self):
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def acquire(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry[1] += 1
+        return entry[0]
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def insert(self, key, value):
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry[1] += 1
+            return entry[0]
+        size = sum(_pixmap_bytes(pixmap) for pixmap in value)
+        self._entries[key] = [value, 1, size]
+        self.bytes += size
+        return value
+
+    def release(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._entries[key]
+            self.bytes -= entry[2]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "bytes": self.bytes, "entries": len(self._entries)}
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+shadow_atlas = ShadowAtlas()
+
+
+class ShadowDiskCache:
+    # Rendered layers kept across launches as raw premultiplied pixels,
+    # named after a digest of their cache key and the library version.
+    # Disabled until a directory is set; the least recently used files are
+    # removed once the directory grows past max_bytes.
+    _HEADER = struct.Struct("<4sIII")
+    _MAGIC = b"NBS1"
+    _SUFFIX = ".shadow"
+
+    def __init__(self, path: str = None, max_bytes: int = 64 << 20):
+        self._path = None
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.setPath(path)
+
+    def setPath(self, path: str = None):
+        self._path = path
+        self._bytes = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._bytes = sum(size for name, size, mtime in self._files())
+
+    def path(self):
+        return self._path
+
+    def setMaxBytes(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._evict()
+
+    def load(self, key):
+        if self._path is None:
+            return None
+        path = self._file(key)
+        with shadow_profiler.stage("disk"):
+            try:
+                with open(path, "rb") as file, mmap.mmap(
+                        file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    magic, w, h, bpl = self._HEADER.unpack_from(data)
+                    if (magic != self._MAGIC
+                            or len(data) != self._HEADER.size + bpl * h):
+                        raise ValueError(f"damaged shadow file: {path}")
+                    # The pixels are read in place and copied once; the
+                    # raster pixmap would otherwise share the mapped memory.
+                    view = memoryview(data)[self._HEADER.size:]
+                    image = QtGui.QImage(
+                            view, w, h, bpl,
+                            QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+                    pixmap = QtGui.QPixmap.fromImage(image.copy())
+                    del image
+                    view.release()
+                os.utime(path)
+            except (OSError, ValueError, struct.error):
+                self.misses += 1
+                shadow_profiler.count("disk_misses")
+                return None
+        self.hits += 1
+        shadow_profiler.count("disk_hits")
+        return pixmap
+
+    def store(self, key, image: QtGui.QImage):
+        if self._path is None:
+            return
+        image = image.convertToFormat(
+                QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        path = self._file(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with shadow_profiler.stage("disk"):
+            try:
+                with open(temporary, "wb") as file:
+                    file.write(self._HEADER.pack(
+                            self._MAGIC, image.width(), image.height(),
+                            image.bytesPerLine()))
+                    file.write(_image_bytes(image))
+                # Readers in other processes never see a partial file.
+                os.replace(temporary, path)
+            except OSError:
+                return
+        self._bytes += self._HEADER.size + image.sizeInBytes()
+        self._evict()
+
+    def clear(self):
+        if self._path is None:
+            return
+        for name, size, mtime in self._files():
+            try:
+                os.remove(os.path.join(self._path, name))
+            except OSError:
+                pass
+        self._bytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "bytes": self._bytes, "path": self._path}
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, key):
+        # Specs, floats and digests have stable reprs across runs.
+        digest = hashlib.blake2b(repr((__version__, key)).encode(),
+                                 digest_size=16).hexdigest()
+        return os.path.join(self._path, digest + self._SUFFIX)
+
+    def _files(self):
+        files = []
         try:
-            from PyQt6 import (
-                QtWidgets,
-                QtCore,
-                QtGui
-            )
-        except ImportError:
+            entries = list(os.scandir(self._path))
+        except OSError:
+            return files
+        for entry in entries:
+            if entry.name.endswith(self._SUFFIX):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((entry.name, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self):
+        if self._path is None or self._bytes <= self._max_bytes:
+            return
+        # Other processes may share the directory, so it is listed again
+        # instead of trusting the running total.
+        files = sorted(self._files(), key=lambda file: file[2])
+        self._bytes = sum(size for name, size, mtime in files)
+        for name, size, mtime in files:
+            if self._bytes <= self._max_bytes:
+                break
             try:
-                from PyQt5 import (
-                    QtWidgets,
-                    QtCore,
-                    QtGui
-                )
-            except ImportError:
+                os.remove(os.path.join(self._path, name))
+            except OSError:
+                continue
+            self._bytes -= size
+
+
+shadow_disk_cache = ShadowDiskCache()
+
+
+class ShadowScheduler:
+    # Shares a per-frame budget in ms between the draws of all effects.
+    # Draws up to the next event loop iteration count as one frame; once
+    # it has spent the budget, adaptive effects draw their last shadows or
+    # cheaper ones, and are drawn at full quality again when no shadow has
+    # been drawn for idle_delay ms. Disabled until a budget is set.
+    def __init__(self, frame_budget: float = None, idle_delay: int = 250):
+        self.enabled = False
+        self._budget = None
+        self._idle_delay = idle_delay
+        self._idle_timer = None
+        self._spent = 0.0
+        self._frame_open = False
+        self._degraded = weakref.WeakSet()
+        self.frames_over_budget = 0
+        self.degradations = 0
+        self.setFrameBudget(frame_budget)
+
+    def setFrameBudget(self, frame_budget: float = None):
+        self._budget = frame_budget
+        self.enabled = frame_budget is not None
+        if not self.enabled:
+            self._spent = 0.0
+            self._restore()
+
+    def frameBudget(self):
+        return self._budget
+
+    def setIdleDelay(self, idle_delay: int):
+        self._idle_delay = idle_delay
+
+    def overBudget(self):
+        return self.enabled and self._spent >= self._budget
+
+    def charge(self, ms: float):
+        if not self.enabled:
+            return
+        if not self._frame_open:
+            self._frame_open = True
+            QtCore.QTimer.singleShot(0, self._end_frame)
+        over = self.overBudget()
+        self._spent += ms
+        if not over and self.overBudget():
+            self.frames_over_budget += 1
+        if self._degraded:
+            if self._idle_timer is None:
+                self._idle_timer = QtCore.QTimer()
+                self._idle_timer.setSingleShot(True)
+                self._idle_timer.timeout.connect(self._restore)
+            self._idle_timer.start(self._idle_delay)
+
+    def degrade(self, effect):
+        self._degraded.add(effect)
+        self.degradations += 1
+
+    def stats(self):
+        return {"budget_ms": self._budget, "spent_ms": self._spent,
+                "degraded": len(self._degraded),
+                "frames_over_budget": self.frames_over_budget,
+                "degradations": self.degradations}
+
+    def _end_frame(self):
+        self._spent = 0.0
+        self._frame_open = False
+
+    def _restore(self):
+        # Effects that do not fit in the budget of the frame they are
+        # redrawn in degrade again and wait for the next idle time.
+        effects = list(self._degraded)
+        self._degraded.clear()
+        for effect in effects:
+            try:
+                effect._restore_quality()
+            except RuntimeError:
+                # Already deleted by Qt.
                 pass
 
 
+shadow_scheduler = ShadowScheduler()
+
+
+class _ShadowCache:
+    # LRU of the atlas entries one effect (or a BoxShadowGroup) keeps
+    # alive, and the renders running on the thread pool for them.
+    def __init__(self, atlas: ShadowAtlas, max_size: int = 16):
+        self._atlas = atlas
+        self._keys = OrderedDict()
+        self._max_size = 0
+        # key -> (token, the effects waiting for it and the frame size
+        # each of them wanted it for).
+        self._pending = {}
+        self._signals = None
+        self.setMaxSize(max_size)
+
+    def setMaxSize(self, max_size: int):
+        self._max_size = max(0, max_size)
+        self._evict()
+
+    def get(self, key):
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            value = self._atlas.get(key)
+        else:
+            value = self._atlas.acquire(key)
+            if value is not None:
+                self._hold(key)
+        shadow_profiler.count("cache_misses" if value is None
+                              else "cache_hits")
+        return value
+
+    def put(self, key, value):
+        # The cache holds one reference per key, however often the key is
+        # rendered.
+        if key in self._keys:
+            self._keys.move_to_end(key)
+            return self._atlas.get(key)
+        value = self._atlas.insert(key, value)
+        self._hold(key)
+        return value
+
+    def renderLater(self, effect, key, frame, context, shadow_list,
+                    inside: bool, smooth: bool, scale: float, backend: str):
+        # One render serves every effect waiting for the key. Results for
+        # another size are outdated before they arrive, and a render is
+        # cancelled when no effect waits for it any more.
+        for pending_key, (token, waiters) in list(self._pending.items()):
+            if waiters.get(effect, frame) != frame:
+                del waiters[effect]
+                if not waiters:
+                    token.cancelled = True
+                    del self._pending[pending_key]
+
+        if key in self._pending:
+            self._pending[key][1][effect] = frame
+            return
+        if self._signals is None:
+            self._signals = _RenderSignals()
+            self._signals.finished.connect(self._render_finished)
+        token = _RenderToken()
+        self._pending[key] = (token, weakref.WeakKeyDictionary(
+                {effect: frame}))
+        context.image()
+        QtCore.QThreadPool.globalInstance().start(_RenderJob(
+                self._signals, key, token, context, shadow_list, inside,
+                smooth, scale, backend))
+
+    def _render_finished(self, key, token, image):
+        pending = self._pending.get(key)
+        if pending is None or pending[0] is not token:
+            return
+        del self._pending[key]
+        shadow_disk_cache.store(key, image)
+        shadow_profiler.count("pixmaps")
+        self.put(key, (QtGui.QPixmap.fromImage(image),))
+        for effect in list(pending[1].keys()):
+            try:
+                effect._dirty.add("layers")
+                effect.update()
+            except RuntimeError:
+                # Already deleted by Qt.
+                pass
+
+    def clear(self):
+        while self._keys:
+            self._atlas.release(self._keys.popitem()[0])
+
+    def _hold(self, key):
+        self._keys[key] = None
+        self._keys.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        while len(self._keys) > self._max_size:
+            self._atlas.release(self._keys.popitem(last=False)[0])
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class _RenderToken:
+    __slots__ = ("cancelled",)
+
+    def __init__(self):
+        self.cancelled = False
+
+
+class _RenderSignals(QtCore.QObject):
+    finished = _Signal(object, object, object)
+
+
+class _RenderJob(QtCore.QRunnable):
+    # Renders shadows from a QImage on a QThreadPool thread; QPixmap and
+    # the scene blur backend must not be used here.
+    def __init__(self, signals: _RenderSignals, key, token: _RenderToken,
+                 context, shadow_list, inside: bool, smooth: bool,
+                 scale: float = 1, backend: str = None):
+        QtCore.QRunnable.__init__(self)
+        # The backend is looked up now, set_blur_backend() may be called
+        # before the job runs.
+        backend, thread_safe = _blur_backends[backend or _blur_backend]
+        if not thread_safe:
+            raise ValueError("the blur backend cannot run outside the GUI "
+                             "thread")
+        self._backend = backend
+        self._signals = signals
+        self._key = key
+        self._token = token
+        self._context = context
+        self._shadow_list = shadow_list
+        self._inside = inside
+        self._smooth = smooth
+        self._scale = scale
+
+    def run(self):
+        if self._token.cancelled:
+            return
+        image = BoxShadow._render_layer(self._context, self._shadow_list,
+                                        self._inside, self._smooth,
+                                        self._token, self._scale,
+                                        self._backend)
+        if not self._token.cancelled:
+            self._signals.finished.emit(self._key, self._token, image)
+
+
+def _nine_slice_axis(start, length, source_length, low, high, scale=1):
+    # Margins are in pixels of the pixmap, the target in painter units
+    # with scale pixels each.
+    fit = min(1, length * scale / max(1, low + high))
+    low, high = low * fit, high * fit
+    return ((0, low, start, low / scale),
+            (low, source_length - low - high, start + low / scale,
+             length - (low + high) / scale),
+            (source_length - high, high, start + length - high / scale,
+             high / scale))
+
+
+def _exposed_rect(painter: QtGui.QPainter):
+    # The part of the device Qt asked to repaint, in untransformed painter
+    # units (device coordinates), or None if it is not limited.
+    exposed = None
+    engine = painter.paintEngine()
+    if engine is not None and not engine.systemClip().isEmpty():
+        ratio = painter.device().devicePixelRatioF()
+        rect = engine.systemClip().boundingRect()
+        exposed = QtCore.QRectF(rect.x() / ratio, rect.y() / ratio,
+                                rect.width() / ratio, rect.height() / ratio)
+    if painter.hasClipping():
+        clip = painter.worldTransform().mapRect(painter.clipBoundingRect())
+        exposed = clip if exposed is None else exposed.intersected(clip)
+    return exposed
+
+
+def _draw_exposed(painter: QtGui.QPainter, target: QtCore.QRectF,
+                  pixmap: QtGui.QPixmap, source: QtCore.QRectF,
+                  exposed: QtCore.QRectF = None):
+    if exposed is not None and not exposed.contains(target):
+        visible = target.intersected(exposed)
+        if visible.isEmpty():
+            return
+        scale_x = source.width() / target.width()
+        scale_y = source.height() / target.height()
+        source = QtCore.QRectF(
+                source.x() + (visible.x() - target.x()) * scale_x,
+                source.y() + (visible.y() - target.y()) * scale_y,
+                visible.width() * scale_x, visible.height() * scale_y)
+        target = visible
+    shadow_profiler.count("blits")
+    if isinstance(pixmap, QtGui.QImage):
+        painter.drawImage(target, pixmap, source)
+    else:
+        painter.drawPixmap(target, pixmap, source)
+
+
+def _draw_nine_slice(painter: QtGui.QPainter, target: QtCore.QRect,
+                     pixmap: QtGui.QPixmap, margins=None, scale=1,
+                     exposed: QtCore.QRectF = None):
+    # Slices outside the exposed rect are skipped and the others are cut
+    # to it.
+    if margins is None:
+        _draw_exposed(painter, QtCore.QRectF(target), pixmap,
+                      QtCore.QRectF(pixmap.rect()), exposed)
+        return
+
+    left, top, right, bottom = margins
+    columns = _nine_slice_axis(target.x(), target.width(), pixmap.width(),
+                               left, right, scale)
+    rows = _nine_slice_axis(target.y(), target.height(), pixmap.height(),
+                            top, bottom, scale)
+    for sx, sw, tx, tw in columns:
+        for sy, sh, ty, th in rows:
+            if sw > 0 and sh > 0 and tw > 0 and th > 0:
+                _draw_exposed(painter, QtCore.QRectF(tx, ty, tw, th), pixmap,
+                              QtCore.QRectF(sx, sy, sw, sh), exposed)
+
+
+# Narrower blurs (in pixels) would show a reduced shadow resolution.
+_MIN_SCALED_BLUR = 8
+
+# How adaptive effects render shadows while a frame is over budget: as
+# usual, without smooth and at _REDUCED_SHADOW_SCALE, or not at all.
+_FULL_QUALITY, _REDUCED_QUALITY, _STALE_QUALITY = range(3)
+_REDUCED_SHADOW_SCALE = 0.5
+
+
 class BoxShadow(QtWidgets.QGraphicsEffect):
     def __init__(self, shadow_list: list[dict] = None,
-                 border: int = 0, smooth: bool = False):
+                 border: int = 0, smooth: bool = False,
+                 cache_size: int = 16, shape: tuple[str, float] = None,
+                 nine_patch: bool = False, asynchronous: bool = False,
+                 shadow_scale: float = 1, adaptive: bool = False):
 
         QtWidgets.QGraphicsEffect.__init__(self)
-        self._shadow_list = []
-
-        self._max_x_offset = 0
-        self._max_y_offset = 0
+        self._shadow_list = ()
+        self._prepared_lists = ()
+        self._prepared_for = None
+        self._last_frame = None
+        # Inputs that changed since the last draw() and the stage results
+        # they invalidate: (key, margins, context) of the shape and
+        # ((outside, inside), margins) of the shadow layers.
+        self._dirty = set()
+        self._frame_size = None
+        self._frame_dpr = None
+        self._frame_backend = None
+        self._frame_shape = None
+        self._frame_layers = None
+        self._asynchronous = asynchronous
+
+        self._extents = (0, 0, 0, 0)
         self._border = 0
         self._smooth = smooth
+        self._shape = None
+        self._nine_patch = nine_patch
+        self._shadow_scale = 1
+        self._adaptive = adaptive
+        # Whether the last layers were not rendered at full quality.
+        self._degraded = False
+        # While animating, the list the animation started from, how far it
+        # got and the blurred shapes its frames are drawn from.
+        self._animation = None
+        self._animation_from = ()
+        self._animation_progress = 0
+        self._animation_bases = {}
+        self._cache = _ShadowCache(shadow_atlas, cache_size)
+        # A bound method would only be held weakly by the connection, and
+        # nothing else keeps the cache alive once the effect is deleted.
+        self._release_cache = partial(_ShadowCache.clear, self._cache)
+        self.destroyed.connect(self._release_cache)
         self.setShadowList(shadow_list)
         self.setBorder(border)
+        self.setShape(shape)
+        self.setShadowScale(shadow_scale)
 
-    def setShadowList(self, shadow_list: list[dict] = None):
+    def setShadowList(self, shadow_list: list[dict | ShadowSpec] = None):
         if shadow_list is None:
             shadow_list = []
+        self._stop_animation()
+        self._shadow_list = _compile_shadow_list(shadow_list)
+        self._dirty.add("shadow_list")
+
+        self._set_extents()
+        self.updateBoundingRect()
+        self.update()
+
+    def animateTo(self, shadow_list: list[dict | ShadowSpec] = None,
+                  duration: int = 150):
+        # Moves offsets, colors and blur to shadow_list over duration ms.
+        # Blur passes through a few fixed radii, and every frame tints and
+        # offsets the shape blurred to the nearest of them instead of
+        # rendering the shadows again.
+        shadow_list = _compile_shadow_list(shadow_list or [])
+        if self._animation is not None and self._animation_from:
+            start = _interpolated_shadow_list(self._animation_from,
+                                              self._shadow_list,
+                                              self._animation_progress)
+        else:
+            start = self._shadow_list
+        self._stop_animation()
+        if duration <= 0 or start == shadow_list:
+            self.setShadowList(shadow_list)
+            return
+
+        if self._animation is None:
+            self._animation = QtCore.QVariantAnimation(self)
+            self._animation.setStartValue(0.0)
+            self._animation.setEndValue(1.0)
+            self._animation.setEasingCurve(QtCore.QEasingCurve.Type.InOutQuad)
+            self._animation.valueChanged.connect(self._animation_step)
+            self._animation.finished.connect(self._animation_finished)
         self._shadow_list = shadow_list
-
-        self._set_max_offset()
+        self._animation_from = start
+        self._animation_progress = 0
+        self._dirty.add("shadow_list")
+        self._set_extents()
+        self.updateBoundingRect()
+        self._animation.setDuration(duration)
+        self._animation.start()
+
+    def _animation_step(self, value):
+        self._animation_progress = value
+        self._dirty.add("animation")
+        self.update()
+
+    def _animation_finished(self):
+        self._animation_from = ()
+        self._animation_bases.clear()
+        self._dirty.add("shadow_list")
+        self._set_extents()
+        self.updateBoundingRect()
+        self.update()
+
+    def _stop_animation(self):
+        if self._animation is not None and self._animation_from:
+            self._animation.stop()
+            self._animation_from = ()
+            self._animation_bases.clear()
+
+    def prepareShadowLists(self, shadow_lists: list[list[dict]] = None):
+        # Lists the effect will switch to. They are rendered in idle time
+        # after a paint, and the effect is padded to fit all of them so
+        # that switching does not change the source geometry.
+        if shadow_lists is None:
+            shadow_lists = []
+        self._prepared_lists = tuple(_compile_shadow_list(shadow_list)
+                                     for shadow_list in shadow_lists)
+        self._prepared_for = None
+
+        self._set_extents()
+        self.updateBoundingRect()
 
     def setBorder(self, border: int):
         if border > 0:
             self._border = border
         else:
             self._border = 0
+        self._dirty.add("border")
+        self.update()
+
+    def setShape(self, shape: tuple[str, float] = None):
+        if shape is not None and (len(shape) != 2
+                                  or shape[0] != "rounded_rect"):
+            raise ValueError(f"unsupported shape: {shape!r}")
+        self._shape = shape
+        self._dirty.add("shape")
+        self.update()
+
+    def setNinePatch(self, nine_patch: bool):
+        self._nine_patch = nine_patch
+        self._dirty.add("shape")
+        self.update()
+
+    def setShadowScale(self, shadow_scale: float):
+        # Wide inside shadows are rendered at this fraction of the
+        # resolution and scaled up.
+        if not 0 < shadow_scale <= 1:
+            raise ValueError(
+                    f"shadow scale must be in (0, 1]: {shadow_scale!r}")
+        self._shadow_scale = shadow_scale
+        self._dirty.add("layers")
+        self.update()
+
+    def setAsynchronous(self, asynchronous: bool):
+        # Render on a QThreadPool while the last good shadow (or none) is
+        # shown. Needs a thread-safe blur backend, otherwise shadows are
+        # still rendered in draw().
+        self._asynchronous = asynchronous
+
+    def setAdaptive(self, adaptive: bool):
+        # When a frame is over the budget of shadow_scheduler, draw the
+        # last shadows, or the first ones without smooth and at a reduced
+        # resolution, until the UI is idle.
+        self._adaptive = adaptive
+
+    def _restore_quality(self):
+        self._dirty.add("layers")
+        self.update()
+
+    def setCacheSize(self, cache_size: int):
+        self._cache.setMaxSize(cache_size)
+
+    def clearCache(self):
+        self._cache.clear()
+        self._frame_layers = None
+        self._dirty.add("layers")
+        self.update()
+
+    def _use_cache(self, cache: _ShadowCache):
+        # Effects of a BoxShadowGroup look their shadows up in the cache of
+        # the group, which outlives any one of them.
+        self.destroyed.disconnect(self._release_cache)
+        self._cache.clear()
+        self._cache = cache
+        self._frame_layers = None
+        self._dirty.add("layers")
 
     def necessary_indentation(self):
-        return self._max_x_offset, self._max_y_offset
-
-    def boundingRectFor(self, rect):
-        return rect.adjusted(-self._max_x_offset, -self._max_y_offset,
-                             self._max_x_offset, self._max_y_offset)
-
-    def _set_max_offset(self):
-        for shadow in self._shadow_list:
-            if "outside" in shadow.keys():
-                if self._max_x_offset < abs(shadow["offset"][0]) \
-                        + shadow["blur"] * 2:
-                    self._max_x_offset = abs(shadow["offset"][0]) \
-                                         + shadow["blur"] * 2
-                if self._max_y_offset < abs(shadow["offset"][1]) \
-                        + shadow["blur"] * 2:
-                    self._max_y_offset = abs(shadow["offset"][1]) \
-                                         + shadow["blur"] * 2
-
-    @staticmethod
-    def _blur_pixmap(src, blur_radius):
-        w, h = src.width(), src.height()
-
-        effect = QtWidgets.QGraphicsBlurEffect(blurRadius=blur_radius)
+        left, top, right, bottom = self._extents
+        return max(left, right), max(top, bottom)
 
-        scene = QtWidgets.QGraphicsScene()
-        item = QtWidgets.QGraphicsPixmapItem()
-        item.setPixmap(QtGui.QPixmap(src))
-        item.setGraphicsEffect(effect)
-        scene.addItem(item)
+    def necessary_margins(self):
+        return self._extents
 
-        res = QtGui.QImage(QtCore.QSize(w, h),
-                           QtGui.QImage.Format.Format_ARGB32)
-        res.fill(QtCore.Qt.GlobalColor.transparent)
+    def boundingRectFor(self, rect):
+        left, top, right, bottom = self._extents
+        return rect.adjusted(-left, -top, right, bottom)
 
-        ptr = QtGui.QPainter(res)
-        ptr.setRenderHints(
-                QtGui.QPainter.RenderHint.Antialiasing |
-                QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-        scene.render(ptr, QtCore.QRectF(), QtCore.QRectF(0, 0, w, h))
-        ptr.end()
+    def _set_extents(self):
+        # Recomputed from the current and prepared lists, so the padding
+        # shrinks again when a list with smaller shadows is set.
+        self._extents = _shadow_extents(self._shadow_list
+                                        + self._animation_from
+                                        + sum(self._prepared_lists, ()))
 
-        return QtGui.QPixmap(res)
+    @staticmethod
+    def _new_image(size: QtCore.QSize):
+        shadow_profiler.count("images")
+        image = QtGui.QImage(size,
+                             QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(QtCore.Qt.GlobalColor.transparent)
+        return image
 
     @staticmethod
-    def _colored_pixmap(color: QtGui.QColor, pixmap: QtGui.QPixmap):
-        new_pixmap = QtGui.QPixmap(pixmap)
-        new_pixmap.fill(color)
-        painter = QtGui.QPainter(new_pixmap)
+    def _colored_image(color: QtGui.QColor, image: QtGui.QImage):
+        shadow_profiler.count("images")
+        shadow_profiler.count("painters")
+        new_image = QtGui.QImage(
+                image.size(), QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        new_image.fill(color)
+        painter = QtGui.QPainter(new_image)
         painter.setTransform(QtGui.QTransform())
         painter.setRenderHints(
                 QtGui.QPainter.RenderHint.Antialiasing |
                 QtGui.QPainter.RenderHint.SmoothPixmapTransform)
         painter.setCompositionMode(
                 QtGui.QPainter.CompositionMode.CompositionMode_DestinationIn)
-        painter.drawPixmap(0, 0, pixmap)
+        painter.drawImage(0, 0, image)
         painter.end()
-        return new_pixmap
+        return new_image
 
     @staticmethod
-    def _cut_shadow(pixmap: QtGui.QPixmap,
-                    source: QtGui.QPixmap,
-                    offset_x, offset_y):
-        painter = QtGui.QPainter(pixmap)
-        painter.setTransform(QtGui.QTransform())
-        painter.setRenderHints(
-                QtGui.QPainter.RenderHint.Antialiasing |
-                QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-        painter.setCompositionMode(
-                QtGui.QPainter.CompositionMode.CompositionMode_DestinationOut)
-        painter.drawPixmap(offset_x, offset_y, source)
-        painter.end()
-        return pixmap
-
-    def _outside_shadow(self):
-
-        source = self.sourcePixmap(
-                QtCore.Qt.CoordinateSystem.DeviceCoordinates)
+    def _blur_groups(shadow_list: tuple[ShadowSpec], inside: bool):
+        # Shadows sharing a blur radius are drawn into one layer and
+        # blurred together.
+        groups = {}
+        for shadow in shadow_list:
+            if shadow.inside == inside:
+                groups.setdefault(shadow.blur, []).append(shadow)
+        return groups.items()
 
-        if isinstance(source, tuple):
-            source = source[0]
+    @staticmethod
+    def _outside_shadow(context: _RenderContext,
+                        shadow_list: tuple[ShadowSpec], token=None,
+                        backend=None):
+        if numpy is None:
+            return BoxShadow._mask_outside_shadow(context, shadow_list, token,
+                                                  backend)
+        return BoxShadow._alpha_shadow(context, shadow_list, token, backend)
 
-        mask = source.createMaskFromColor(
-                QtGui.QColor(0, 0, 0, 0), QtCore.Qt.MaskMode.MaskInColor)
+    @staticmethod
+    def _inside_shadow(context: _RenderContext,
+                       shadow_list: tuple[ShadowSpec], token=None,
+                       backend=None):
+        return BoxShadow._inset_shadow(context, shadow_list, token,
+                                       backend=backend)
 
-        _pixmap_shadow_list = []
+    @staticmethod
+    def _blurred_alpha(context: _RenderContext, blur, pad: int,
+                       backend=None):
+        # The shape blurred with pad pixels around it, so moving it by up
+        # to pad does not uncover a cut edge; offset() is where it is
+        # drawn.
+        alpha = context.alpha()
+        shadow_profiler.count("images")
+        padded = QtGui.QImage(alpha.width() + pad * 2,
+                              alpha.height() + pad * 2,
+                              QtGui.QImage.Format.Format_Alpha8)
+        padded.fill(0)
+        shadow_profiler.count("painters")
+        painter = QtGui.QPainter(padded)
+        painter.drawImage(pad, pad, alpha)
+        painter.end()
+        blurred = blur_image(padded, blur, backend)
+        if blurred.format() != QtGui.QImage.Format.Format_Alpha8:
+            blurred = blurred.convertToFormat(
+                    QtGui.QImage.Format.Format_Alpha8)
+        blurred.setOffset(QtCore.QPoint(-pad, -pad))
+        return blurred
 
-        for _shadow in self._shadow_list:
-            if "outside" in _shadow.keys():
-                shadow = QtGui.QPixmap(mask.size())
-                shadow.fill(QtCore.Qt.GlobalColor.transparent)
-                shadow_painter = QtGui.QPainter(shadow)
-                shadow_painter.setRenderHints(
-                        QtGui.QPainter.RenderHint.Antialiasing |
+    @staticmethod
+    def _inset_shadow(context: _RenderContext,
+                      shadow_list: tuple[ShadowSpec], token=None,
+                      offset_scale: float = 1, blurred=None,
+                      backend=None):
+        # An inside shadow is cast by everything around the shape: its
+        # color, with the blurred shape moved by the offset erased from
+        # it, cut to the shape. The shape is blurred once per radius and
+        # one layer is refilled for every shadow, so neither the source
+        # nor the colors are copied. blurred(blur, pad) may return a
+        # blurred alpha that is kept elsewhere.
+        if blurred is None:
+            blurred = partial(BoxShadow._blurred_alpha, context,
+                              backend=backend)
+        size = context.image().size()
+        shadow = None
+        layer = None
+
+        for blur, group in BoxShadow._blur_groups(shadow_list, True):
+            if token is not None and token.cancelled:
+                break
+            base = blurred(blur, int(max(
+                    max(abs(offset) for offset in _shadow.offset)
+                    for _shadow in group) * offset_scale) + 1)
+            for _shadow in group:
+                # The first shadow is drawn in place, the others are
+                # composited over it.
+                if shadow is None:
+                    shadow_profiler.count("images")
+                    shadow = target = QtGui.QImage(
+                            size,
+                            QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+                else:
+                    if layer is None:
+                        shadow_profiler.count("images")
+                        layer = QtGui.QImage(
+                                size,
+                                QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+                    target = layer
+                target.fill(_shadow.color)
+                shadow_profiler.count("painters")
+                painter = QtGui.QPainter(target)
+                painter.setRenderHint(
                         QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-                shadow_painter.setTransform(QtGui.QTransform())
-                shadow_painter.setPen(QtGui.QColor(_shadow["color"]))
-                shadow_painter.drawPixmap(_shadow["offset"][0],
-                                          _shadow["offset"][1], mask)
-                shadow_painter.end()
+                painter.setCompositionMode(
+                        QtGui.QPainter.CompositionMode
+                        .CompositionMode_DestinationOut)
+                painter.drawImage(QtCore.QPointF(
+                        base.offset().x() + _shadow.offset[0] * offset_scale,
+                        base.offset().y() + _shadow.offset[1] * offset_scale),
+                        base)
+                painter.end()
+                if target is layer:
+                    shadow_profiler.count("painters")
+                    painter = QtGui.QPainter(shadow)
+                    painter.drawImage(0, 0, layer)
+                    painter.end()
+
+        if shadow is None:
+            return BoxShadow._new_image(size)
+        if context.clip:
+            shadow_profiler.count("painters")
+            painter = QtGui.QPainter(shadow)
+            painter.setCompositionMode(
+                    QtGui.QPainter.CompositionMode
+                    .CompositionMode_DestinationIn)
+            painter.drawImage(0, 0, context.alpha())
+            painter.end()
+
+        return shadow
 
-                _pixmap_shadow_list.append(shadow)
+    @staticmethod
+    def _alpha_shadow(context: _RenderContext,
+                      shadow_list: tuple[ShadowSpec], token=None,
+                      backend=None):
+        # Works on the alpha channel of the source, so edges keep their
+        # antialiasing. Shadows of one color are merged and blurred as a
+        # single 8-bit coverage image, then tinted.
+        alpha = context.alphaArray()
+
+        shadow = BoxShadow._new_image(context.image().size())
+
+        shadow_profiler.count("painters")
+        shadow_painter = QtGui.QPainter(shadow)
+        shadow_painter.setTransform(QtGui.QTransform())
+
+        for blur, group in BoxShadow._blur_groups(shadow_list, False):
+            if token is not None and token.cancelled:
+                break
+            coverages = [_shifted_alpha(alpha, _shadow.offset)
+                         for _shadow in group]
+
+            if len({_shadow.rgba for _shadow in group}) == 1:
+                coverage = coverages[0]
+                for other in coverages[1:]:
+                    coverage = _alpha_over(coverage, other)
+                blurred = blur_image(_alpha8_image(coverage), blur, backend)
+                if blurred.format() != QtGui.QImage.Format.Format_Alpha8:
+                    blurred = blurred.convertToFormat(
+                            QtGui.QImage.Format.Format_Alpha8)
+                shadow_painter.drawImage(0, 0, _tinted_image(
+                        _alpha_array(blurred), group[0].premultiplied))
+                continue
+
+            layer = BoxShadow._new_image(shadow.size())
+            shadow_profiler.count("painters")
+            layer_painter = QtGui.QPainter(layer)
+            for _shadow, coverage in zip(group, coverages):
+                layer_painter.drawImage(0, 0, _tinted_image(
+                        coverage, _shadow.premultiplied))
+            layer_painter.end()
+            shadow_painter.drawImage(0, 0, blur_image(layer, blur, backend))
+
+        if context.clip:
+            shadow_painter.setCompositionMode(
+                    QtGui.QPainter.CompositionMode
+                    .CompositionMode_DestinationIn)
+            shadow_painter.drawImage(0, 0, context.invertedAlpha())
+        shadow_painter.end()
+
+        return shadow
 
-        outside_shadow = QtGui.QPixmap(mask.size())
-        outside_shadow.fill(QtCore.Qt.GlobalColor.transparent)
+    @staticmethod
+    def _mask_outside_shadow(context: _RenderContext,
+                             shadow_list: tuple[ShadowSpec], token=None,
+                             backend=None):
+        # Used without NumPy: 1-bit masks, so edges are not antialiased.
+        mask = context.mask()
 
+        outside_shadow = BoxShadow._new_image(mask.size())
+
+        shadow_profiler.count("painters")
         outside_shadow_painter = QtGui.QPainter(outside_shadow)
         outside_shadow_painter.setTransform(QtGui.QTransform())
         outside_shadow_painter.setRenderHints(
                 QtGui.QPainter.RenderHint.Antialiasing |
                 QtGui.QPainter.RenderHint.SmoothPixmapTransform)
 
-        for i, pixmap in enumerate(_pixmap_shadow_list):
-            outside_shadow_painter.drawPixmap(
-                    0, 0,
-                    self._blur_pixmap(pixmap, self._shadow_list[i]["blur"]))
+        layer = BoxShadow._new_image(mask.size())
+
+        for blur, group in BoxShadow._blur_groups(shadow_list, False):
+            if token is not None and token.cancelled:
+                break
+            layer.fill(QtCore.Qt.GlobalColor.transparent)
+            shadow_profiler.count("painters")
+            layer_painter = QtGui.QPainter(layer)
+            layer_painter.setRenderHints(
+                    QtGui.QPainter.RenderHint.Antialiasing |
+                    QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+            layer_painter.setTransform(QtGui.QTransform())
+            for _shadow in group:
+                mask.setColor(1, _shadow.rgba)
+                layer_painter.drawImage(
+                        QtCore.QPointF(_shadow.offset[0], _shadow.offset[1]),
+                        mask)
+            layer_painter.end()
+
+            outside_shadow_painter.drawImage(0, 0, blur_image(layer, blur,
+                                                              backend))
+
+        if context.clip:
+            outside_shadow_painter.setCompositionMode(
+                    QtGui.QPainter.CompositionMode
+                    .CompositionMode_DestinationIn)
+            outside_shadow_painter.drawImage(0, 0, context.mask(False))
 
         outside_shadow_painter.end()
 
-        source = self.sourcePixmap(
-                QtCore.Qt.CoordinateSystem.DeviceCoordinates)
-
-        if isinstance(source, tuple):
-            source = source[0]
-
-        mask = source.createMaskFromColor(
-                QtGui.QColor(0, 0, 0, 0), QtCore.Qt.MaskMode.MaskOutColor)
-
-        outside_shadow.setMask(mask)
-
         return outside_shadow
 
-    def _inside_shadow(self):
-
-        source = self.sourcePixmap(
-                QtCore.Qt.CoordinateSystem.DeviceCoordinates)
-
-        if isinstance(source, tuple):
-            source = source[0]
-
-        mask = source.createMaskFromColor(
-                QtGui.QColor(0, 0, 0, 0), QtCore.Qt.MaskMode.MaskInColor)
-
-        _pixmap_shadow_list = []
-
-        for _shadow in self._shadow_list:
-            if "inside" in _shadow.keys():
-                shadow = QtGui.QPixmap(mask.size())
-                shadow.fill(QtCore.Qt.GlobalColor.transparent)
-                shadow_painter = QtGui.QPainter(shadow)
-                shadow_painter.setRenderHints(
-                        QtGui.QPainter.RenderHint.Antialiasing |
-                        QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-
-                removed_color = "#000000"
-                color = QtGui.QColor(_shadow["color"])
-                if removed_color == color.name():
-                    removed_color = "#FFFFFF"
-
-                shadow_painter.setTransform(QtGui.QTransform())
-                shadow_painter.setPen(color)
-                shadow_painter.drawPixmap(0, 0, mask)
-                shadow_painter.setPen(QtGui.QColor(removed_color))
-                shadow_painter.drawPixmap(_shadow["offset"][0],
-                                          _shadow["offset"][1], mask)
-
-                shadow_mask = shadow.createMaskFromColor(
-                        color,
-                        QtCore.Qt.MaskMode.MaskOutColor)
-                shadow.fill(QtCore.Qt.GlobalColor.transparent)
-                shadow_painter.setPen(color)
-                shadow_painter.drawPixmap(0, 0, shadow_mask)
-
-                shadow_painter.end()
-
-                shadow.scaled(mask.size())
-
-                _pixmap_shadow_list.append(shadow)
-
-        inside_shadow = QtGui.QPixmap(mask.size())
-        inside_shadow.fill(QtCore.Qt.GlobalColor.transparent)
-
-        inside_shadow_painter = QtGui.QPainter(inside_shadow)
-        inside_shadow_painter.setTransform(QtGui.QTransform())
-        inside_shadow_painter.setRenderHints(
-                QtGui.QPainter.RenderHint.Antialiasing |
-                QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-
-        for i, pixmap in enumerate(_pixmap_shadow_list):
-            inside_shadow_painter.drawPixmap(
-                    0, 0,
-                    self._blur_pixmap(pixmap, self._shadow_list[i]["blur"]))
-
-        inside_shadow_painter.end()
-
-        inside_shadow.setMask(mask)
-
-        return inside_shadow
-
-    def _smooth_outside_shadow(self):
-        source = self.sourcePixmap(
-                QtCore.Qt.CoordinateSystem.DeviceCoordinates)
-
-        if isinstance(source, tuple):
-            source = source[0]
-
-        if isinstance(source, tuple):
-            source = source[0]
-
+    @staticmethod
+    def _smooth_outside_shadow(context: _RenderContext,
+                               shadow_list: tuple[ShadowSpec], token=None,
+                               backend=None):
+        source = context.image()
         w, h = source.width(), source.height()
 
-        _pixmap_shadow_list = []
-
-        for _shadow in self._shadow_list:
-            if "outside" in _shadow.keys():
-                shadow = QtGui.QPixmap(source.size())
-                shadow.fill(QtCore.Qt.GlobalColor.transparent)
-                shadow_painter = QtGui.QPainter(shadow)
-                shadow_painter.setRenderHints(
-                        QtGui.QPainter.RenderHint.Antialiasing |
-                        QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-                shadow_painter.setTransform(QtGui.QTransform())
-                shadow_painter.drawPixmap(
-                        _shadow["offset"][0],
-                        _shadow["offset"][1],
-                        w, h,
-                        self._colored_pixmap(_shadow["color"], source))
-                shadow_painter.end()
-
-                _pixmap_shadow_list.append(shadow)
-
-        outside_shadow = QtGui.QPixmap(source.size())
-        outside_shadow.fill(QtCore.Qt.GlobalColor.transparent)
+        outside_shadow = BoxShadow._new_image(source.size())
 
+        shadow_profiler.count("painters")
         outside_shadow_painter = QtGui.QPainter(outside_shadow)
         outside_shadow_painter.setTransform(QtGui.QTransform())
         outside_shadow_painter.setRenderHints(
                 QtGui.QPainter.RenderHint.Antialiasing |
                 QtGui.QPainter.RenderHint.SmoothPixmapTransform)
 
-        for i, pixmap in enumerate(_pixmap_shadow_list):
-            outside_shadow_painter.drawPixmap(
-                    0, 0, w, h,
-                    self._blur_pixmap(pixmap, self._shadow_list[i]["blur"]))
-
-        outside_shadow_painter.end()
-
-        outside_shadow_painter = QtGui.QPainter(outside_shadow)
-        outside_shadow_painter.setTransform(QtGui.QTransform())
-        outside_shadow_painter.setRenderHints(
-                QtGui.QPainter.RenderHint.Antialiasing |
-                QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-        outside_shadow_painter.setCompositionMode(
-                QtGui.QPainter.CompositionMode.CompositionMode_DestinationOut)
-        outside_shadow_painter.drawPixmap(0, 0, w, h, source)
+        layer = BoxShadow._new_image(source.size())
+
+        for blur, group in BoxShadow._blur_groups(shadow_list, False):
+            if token is not None and token.cancelled:
+                break
+            layer.fill(QtCore.Qt.GlobalColor.transparent)
+            shadow_profiler.count("painters")
+            layer_painter = QtGui.QPainter(layer)
+            layer_painter.setRenderHints(
+                    QtGui.QPainter.RenderHint.Antialiasing |
+                    QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+            layer_painter.setTransform(QtGui.QTransform())
+            for _shadow in group:
+                layer_painter.drawImage(
+                        QtCore.QRectF(_shadow.offset[0], _shadow.offset[1],
+                                      w, h),
+                        BoxShadow._colored_image(_shadow.color, source))
+            layer_painter.end()
+
+            outside_shadow_painter.drawImage(
+                    QtCore.QRect(0, 0, w, h), blur_image(layer, blur, backend))
+
+        if context.clip:
+            outside_shadow_painter.setCompositionMode(
+                    QtGui.QPainter.CompositionMode
+                    .CompositionMode_DestinationOut)
+            outside_shadow_painter.drawImage(QtCore.QRect(0, 0, w, h),
+                                             source)
 
         outside_shadow_painter.end()
 
         return outside_shadow
 
-    def _smooth_inside_shadow(self):
-
-        source = self.sourcePixmap(
-                QtCore.Qt.CoordinateSystem.DeviceCoordinates)
-
-        if isinstance(source, tuple):
-            source = source[0]
-
-        w, h = source.width(), source.height()
-
-        _pixmap_shadow_list = []
+    @staticmethod
+    def _smooth_inside_shadow(context: _RenderContext,
+                              shadow_list: tuple[ShadowSpec], token=None,
+                              backend=None):
+        # Smooth inside shadows are moved by half their offset.
+        return BoxShadow._inset_shadow(context, shadow_list, token, 0.5,
+                                       backend=backend)
 
-        for _shadow in self._shadow_list:
-            if "inside" in _shadow.keys():
-                shadow = QtGui.QPixmap(source.size())
-                shadow.fill(QtCore.Qt.GlobalColor.transparent)
-                shadow_painter = QtGui.QPainter(shadow)
-                shadow_painter.setRenderHints(
-                        QtGui.QPainter.RenderHint.Antialiasing |
-                        QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-                shadow_painter.setTransform(QtGui.QTransform())
-                new_source = self._colored_pixmap(_shadow["color"], source)
-                shadow_painter.drawPixmap(
-                        0, 0, w, h,
-                        self._cut_shadow(new_source, source,
-                                         _shadow["offset"][0] / 2,
-                                         _shadow["offset"][1] / 2))
-                shadow_painter.end()
-
-                _pixmap_shadow_list.append(shadow)
-
-        inside_shadow = QtGui.QPixmap(source.size())
-        inside_shadow.fill(QtCore.Qt.GlobalColor.transparent)
-
-        inside_shadow_painter = QtGui.QPainter(inside_shadow)
-        inside_shadow_painter.setTransform(QtGui.QTransform())
-        inside_shadow_painter.setRenderHints(
-                QtGui.QPainter.RenderHint.Antialiasing |
-                QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+    @staticmethod
+    def _render_layer(context: _RenderContext,
+                      shadow_list: tuple[ShadowSpec], inside: bool,
+                      smooth: bool, token=None, scale: float = 1,
+                      backend=None):
+        if smooth:
+            render = (BoxShadow._smooth_inside_shadow if inside
+                      else BoxShadow._smooth_outside_shadow)
+        else:
+            render = (BoxShadow._inside_shadow if inside
+                      else BoxShadow._outside_shadow)
+        with shadow_profiler.stage("render"):
+            if scale == 1:
+                return render(context, shadow_list, token, backend)
+            # Rendered smaller and scaled back, which a wide blur hides;
+            # only the cut to the shape needs the full resolution.
+            return context.clipShadow(
+                    render(context.scaled(scale),
+                           _scaled_shadow_list(shadow_list, scale), token,
+                           backend),
+                    inside)
 
-        for i, pixmap in enumerate(_pixmap_shadow_list):
-            inside_shadow_painter.drawPixmap(
-                    0, 0, w, h,
-                    self._blur_pixmap(pixmap, self._shadow_list[i]["blur"]))
+    @staticmethod
+    def _shadow_reach(shadow_list: tuple[ShadowSpec]):
+        reach = 0
+        for shadow in shadow_list:
+            reach = max(reach, *shadow.extent)
+        return reach
 
-        inside_shadow_painter.end()
+    @staticmethod
+    def _rounded_rect_shape(shadow_list: tuple[ShadowSpec], w, h, dpr,
+                            extents, radius):
+        # Shadows of a rounded rect only vary near its corners, so they are
+        # rendered once for a rect just large enough to hold the corners
+        # and nine-sliced to any size.
+        pads = tuple(round(extent * dpr) for extent in extents)
+        left, top, right, bottom = pads
+        inner_w, inner_h = w - left - right, h - top - bottom
+        radius = max(0, min(radius * dpr, inner_w / 2, inner_h / 2))
+        reach = int(radius + BoxShadow._shadow_reach(shadow_list)) + 1
+        tile_w = max(1, min(inner_w, reach * 2 + 1))
+        tile_h = max(1, min(inner_h, reach * 2 + 1))
+        margins = (left + (tile_w - 1) // 2, top + (tile_h - 1) // 2,
+                   right + (tile_w - 1) // 2, bottom + (tile_h - 1) // 2)
+
+        key = ("rounded_rect", radius, tile_w, tile_h) + pads
+        return key, margins, _RenderContext(partial(
+                BoxShadow._rounded_rect_proxy, radius, tile_w, tile_h, pads),
+                dpr=dpr)
 
-        inside_shadow_painter = QtGui.QPainter(inside_shadow)
-        inside_shadow_painter.setTransform(QtGui.QTransform())
-        inside_shadow_painter.setRenderHints(
+    @staticmethod
+    def _rounded_rect_proxy(radius, tile_w, tile_h, pads):
+        left, top, right, bottom = pads
+        shadow_profiler.count("images")
+        shadow_profiler.count("painters")
+        proxy = QtGui.QImage(tile_w + left + right, tile_h + top + bottom,
+                             QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+        proxy.fill(QtCore.Qt.GlobalColor.transparent)
+        proxy_painter = QtGui.QPainter(proxy)
+        proxy_painter.setRenderHints(
                 QtGui.QPainter.RenderHint.Antialiasing |
                 QtGui.QPainter.RenderHint.SmoothPixmapTransform)
-        inside_shadow_painter.setCompositionMode(
-                QtGui.QPainter.CompositionMode.CompositionMode_DestinationIn)
-        inside_shadow_painter.drawPixmap(0, 0, w, h, source)
-
-        inside_shadow_painter.end()
-
-        return inside_shadow
+        proxy_painter.setPen(QtCore.Qt.PenStyle.NoPen)
+        proxy_painter.setBrush(QtGui.QColor(0, 0, 0))
+        proxy_painter.drawRoundedRect(
+                QtCore.QRectF(left, top, tile_w, tile_h),
+                radius, radius)
+        proxy_painter.end()
+        return proxy
+
+    def _shape_stage(self, shadow_list: tuple[ShadowSpec], w, h,
+                     context: _RenderContext):
+        # Returns (key, margins, context) of the shape the shadows are cast
+        # by. Sizes and shadows are in pixels.
+        if self._shape is not None:
+            return self._rounded_rect_shape(shadow_list, w, h, context.dpr,
+                                            self._extents, self._shape[1])
+
+        with shadow_profiler.stage("shape"):
+            shape, margins = context, None
+            if self._nine_patch:
+                shape, margins = _nine_patch_source(
+                        context, int(self._shadow_reach(shadow_list)) + 1)
+            image = shape.image()
+            key = (image.width(), image.height(), _alpha_hash(shape.alpha()))
+        return key, margins, shape
+
+    def _layer_stage(self, shadow_list: tuple[ShadowSpec], shape, frame,
+                     quality: int = _FULL_QUALITY):
+        # Outside and inside shadows are cached apart, so changing one of
+        # them does not render the other again. Returns None while a layer
+        # is still being rendered asynchronously, or if it is not cached
+        # at _STALE_QUALITY.
+        shape_key, margins, context = shape
+        layers = []
+        for inside in (False, True):
+            layer_list = tuple(shadow for shadow in shadow_list
+                               if shadow.inside == inside)
+            if not layer_list:
+                layers.append(None)
+                continue
+            # The blur backends already downsample wide outside blurs, only
+            # the full-size inside layers gain from a reduced resolution.
+            wide = min(shadow.blur for shadow
+                       in layer_list) >= _MIN_SCALED_BLUR
+            smooth, scale = self._smooth, 1
+            if inside and wide:
+                scale = self._shadow_scale
+            key = shape_key + (inside, layer_list, smooth, scale,
+                               _blur_backend)
+            layer = self._cache.get(key)
+            if layer is None and quality == _STALE_QUALITY:
+                shadow_profiler.count("layers_stale")
+                self._degraded = True
+                return None
+            if layer is None and quality == _REDUCED_QUALITY:
+                # Outside layers are cheaper at a reduced resolution too,
+                # if not as much.
+                smooth = False
+                if wide:
+                    scale = min(scale, _REDUCED_SHADOW_SCALE)
+                reduced_key = shape_key + (inside, layer_list, smooth, scale,
+                                           _blur_backend)
+                if reduced_key != key:
+                    shadow_profiler.count("layers_reduced")
+                    self._degraded = True
+                    key = reduced_key
+                    layer = self._cache.get(key)
+            if layer is None:
+                layer = self._render_cached(key, context, layer_list,
+                                            inside, smooth, scale, frame)
+                if layer is None:
+                    return None
+            layers.append(layer[0])
+        return tuple(layers), margins
+
+    def _shadows(self, shadow_list: tuple[ShadowSpec], w, h,
+                 context: _RenderContext):
+        shadow_list = _scaled_shadow_list(shadow_list, context.dpr)
+        return self._layer_stage(
+                shadow_list, self._shape_stage(shadow_list, w, h, context),
+                (w, h))
+
+    def _render_cached(self, key, context: _RenderContext,
+                       shadow_list: tuple[ShadowSpec], inside: bool,
+                       smooth: bool, scale: float, frame):
+        pixmap = shadow_disk_cache.load(key)
+        if pixmap is not None:
+            shadow_profiler.count("pixmaps")
+            return self._cache.put(key, (pixmap,))
+
+        # Keys end with the blur backend, which the render must use even if
+        # another one is set before it runs.
+        backend, thread_safe = _blur_backends[key[-1]]
+        if not (self._asynchronous and thread_safe):
+            image = self._render_layer(context, shadow_list, inside,
+                                       smooth, scale=scale, backend=backend)
+            shadow_disk_cache.store(key, image)
+            shadow_profiler.count("pixmaps")
+            with shadow_profiler.stage("upload"):
+                return self._cache.put(key, (QtGui.QPixmap.fromImage(image),))
+
+        self._cache.renderLater(self, key, frame, context, shadow_list,
+                                inside, smooth, scale, key[-1])
+        return None
+
+    def _animation_base(self, shape_key, context: _RenderContext, blur,
+                        pad: int = None):
+        # The shape blurred to one of the animation's radii, shared by the
+        # outside and inside shadows of every frame. The offsets change
+        # from frame to frame, so it is padded by the whole reach of the
+        # blur instead of pad.
+        key = (shape_key, blur, _blur_backend)
+        base = self._animation_bases.get(key)
+        if base is None:
+            base = self._blurred_alpha(context, blur, int(blur * 2) + 1)
+            self._animation_bases[key] = base
+        return base
+
+    def _animation_layers(self, dpr):
+        shape_key, margins, context = self._frame_shape
+        shadow_list = _scaled_shadow_list(_interpolated_shadow_list(
+                self._animation_from, self._shadow_list,
+                self._animation_progress), dpr)
+        layers = []
+        with shadow_profiler.stage("render"):
+            for inside in (False, True):
+                layer_list = tuple(shadow for shadow in shadow_list
+                                   if shadow.inside == inside
+                                   and shadow.color.alpha() > 0)
+                if not layer_list:
+                    layers.append(None)
+                    continue
+                base = partial(self._animation_base, shape_key, context)
+                if inside:
+                    layer = self._inset_shadow(
+                            context, layer_list,
+                            offset_scale=0.5 if self._smooth else 1,
+                            blurred=base)
+                else:
+                    layer = self._animation_layer(context, layer_list, base)
+                shadow_profiler.count("pixmaps")
+                layers.append(QtGui.QPixmap.fromImage(layer))
+        return tuple(layers), margins
+
+    def _animation_layer(self, context: _RenderContext,
+                         shadow_list: tuple[ShadowSpec], base):
+        shadow = self._new_image(context.image().size())
+        shadow_profiler.count("painters")
+        painter = QtGui.QPainter(shadow)
+        for _shadow in shadow_list:
+            blurred = base(_shadow.blur)
+            painter.drawImage(QtCore.QPointF(
+                    blurred.offset().x() + _shadow.offset[0],
+                    blurred.offset().y() + _shadow.offset[1]),
+                    self._colored_image(_shadow.color, blurred))
+
+        if context.clip:
+            painter.setCompositionMode(
+                    QtGui.QPainter.CompositionMode.CompositionMode_DestinationIn)
+            painter.drawImage(0, 0, context.invertedAlpha())
+        painter.end()
+        return shadow
+
+    def _prepare_shadow_lists(self):
+        if self._last_frame is None:
+            return
+        for shadow_list in self._prepared_lists:
+            self._shadows(shadow_list, *self._last_frame)
+
+    def _update_frame(self, w, h, context: _RenderContext):
+        if (w, h) != self._frame_size:
+            self._frame_size = (w, h)
+            self._dirty.add("size")
+        if context.dpr != self._frame_dpr:
+            self._frame_dpr = context.dpr
+            self._dirty.add("dpr")
+        if _blur_backend != self._frame_backend:
+            self._frame_backend = _blur_backend
+            self._dirty.add("layers")
+        if self._shape is None:
+            # Whether the content changed the shape is only known from its
+            # alpha hash.
+            self._dirty.add("shape")
+
+        if self._frame_shape is None or self._dirty & {
+                "shape", "size", "dpr", "shadow_list"}:
+            # While animating, the shape must fit the shadows of both ends.
+            shape = self._shape_stage(_scaled_shadow_list(
+                    self._shadow_list + self._animation_from, context.dpr),
+                    w, h, context)
+            if self._frame_shape is None or shape[0] != self._frame_shape[0]:
+                self._dirty.add("layers")
+            self._frame_shape = shape
+
+        if self._animation_from:
+            self._frame_layers = self._animation_layers(context.dpr)
+        elif self._frame_layers is None or self._dirty & {
+                "layers", "shadow_list", "animation"}:
+            shadow_list = _scaled_shadow_list(self._shadow_list, context.dpr)
+            quality = _FULL_QUALITY
+            if self._adaptive and shadow_scheduler.overBudget():
+                quality = (_STALE_QUALITY if self._frame_layers is not None
+                           else _REDUCED_QUALITY)
+            self._degraded = False
+            layers = self._layer_stage(shadow_list, self._frame_shape, (w, h),
+                                       quality)
+            if self._degraded:
+                shadow_scheduler.degrade(self)
+            if layers is None:
+                # Keep drawing the previous layers until the new ones are
+                # rendered.
+                self._dirty = {"layers"}
+                return
+            self._frame_layers = layers
+        self._dirty.clear()
+
+    def _frame_fits(self, rect: QtCore.QRect, dpr):
+        # Whether the layers of the last frame can be drawn in rect as they
+        # are.
+        return (not self._dirty and self._frame_layers is not None
+                and self._last_frame is not None
+                and self._last_frame[2].rect.size() == rect.size()
+                and self._frame_dpr == dpr)
 
     def draw(self, painter):
+        shadow_profiler.beginFrame()
+        start = time.perf_counter()
 
         painter.setRenderHints(
                 QtGui.QPainter.RenderHint.Antialiasing |
                 QtGui.QPainter.RenderHint.SmoothPixmapTransform)
         restoreTransform = painter.worldTransform()
 
-        source_rect = self.boundingRectFor(
-                self.sourceBoundingRect(
-                        QtCore.Qt.CoordinateSystem.DeviceCoordinates)).toRect()
-        x, y, w, h = source_rect.getRect()
-
-        source = self.sourcePixmap(
+        widget_rect = self.sourceBoundingRect(
                 QtCore.Qt.CoordinateSystem.DeviceCoordinates)
-
-        if isinstance(source, tuple):
-            source = source[0]
+        rect = self.boundingRectFor(widget_rect).toRect()
+        x, y, w, h = rect.getRect()
+
+        # Only the region Qt repaints is composited, so scrolling redraws
+        # just the newly exposed strips of the shadows. If none of the
+        # widget itself is exposed it was not repainted, and the layers of
+        # the last frame are drawn without fetching and hashing the source.
+        exposed = _exposed_rect(painter)
+        source = None
+        if (exposed is None or exposed.intersects(widget_rect)
+                or not self._frame_fits(
+                        rect, painter.device().devicePixelRatioF())):
+            with shadow_profiler.stage("source"):
+                source = _source_pixmap(
+                        self, QtCore.Qt.CoordinateSystem.DeviceCoordinates)
 
         painter.setTransform(QtGui.QTransform())
 
-        if self._smooth:
-            outside_shadow = self._smooth_outside_shadow()
-            inside_shadow = self._smooth_inside_shadow()
+        if source is not None:
+            # On high-DPI screens the source has more pixels than the rect
+            # it is drawn in; shadows are rendered at the pixel size.
+            dpr = source.devicePixelRatioF()
+            pixel_w, pixel_h = source.width(), source.height()
+            context = _RenderContext(source, rect, dpr)
+            self._update_frame(pixel_w, pixel_h, context)
+
+            self._last_frame = (pixel_w, pixel_h, context)
+            if (self._prepared_lists
+                    and self._prepared_for != (pixel_w, pixel_h)):
+                self._prepared_for = (pixel_w, pixel_h)
+                QtCore.QTimer.singleShot(0, self._prepare_shadow_lists)
         else:
-            outside_shadow = self._outside_shadow()
-            inside_shadow = self._inside_shadow()
+            shadow_profiler.count("frames_reused")
+            dpr = self._frame_dpr
+        (outside_shadow, inside_shadow), margins = (
+                self._frame_layers or ((None, None), None))
 
         painter.setPen(QtCore.Qt.PenStyle.NoPen)
 
-        painter.drawPixmap(x, y, w, h, outside_shadow)
-        painter.drawPixmap(x, y, source)
-        painter.drawPixmap(x + self._border, y + self._border,
-                           w - self._border * 2, h - self._border * 2,
-                           inside_shadow)
+        with shadow_profiler.stage("composite"):
+            if outside_shadow is not None:
+                _draw_nine_slice(painter, rect, outside_shadow,
+                                 margins, dpr, exposed)
+            if source is not None:
+                _draw_exposed(painter, QtCore.QRectF(
+                                      x, y, pixel_w / dpr, pixel_h / dpr),
+                              source, QtCore.QRectF(source.rect()), exposed)
+            if inside_shadow is not None:
+                border = self._border
+                _draw_nine_slice(painter, rect.adjusted(
+                                         border, border, -border, -border),
+                                 inside_shadow, margins, dpr, exposed)
         painter.setWorldTransform(restoreTransform)
 
         painter.end()
+        shadow_scheduler.charge((time.perf_counter() - start) * 1000)
+        shadow_profiler.endFrame()
 
 
 class BoxShadowWrapper(QtWidgets.QWidget):
@@ -443,7 +2136,11 @@ class BoxShadowWrapper(QtWidgets.QWidget):
                  border: int = 0, disable_margins: bool = False,
                  margins: tuple[float, float, float, float] |
                           tuple[float, float] = None,
-                 smooth: bool = False):
+                 smooth: bool = False, cache_size: int = 16,
+                 shape: tuple[str, float] = None, nine_patch: bool = False,
+                 states: dict[str, list[dict]] = None,
+                 asynchronous: bool = False, shadow_scale: float = 1,
+                 adaptive: bool = False):
         QtWidgets.QWidget.__init__(self)
 
         self._widget = widget
@@ -452,15 +2149,27 @@ class BoxShadowWrapper(QtWidgets.QWidget):
 
         self.mLayout.addWidget(self._widget)
 
-        self.boxShadow = BoxShadow(shadow_list, border, smooth)
+        self.boxShadow = BoxShadow(shadow_list, border, smooth, cache_size,
+                                   shape, nine_patch, asynchronous,
+                                   shadow_scale, adaptive)
         self._widget.setGraphicsEffect(self.boxShadow)
 
+        self._states = {}
+        self._state = None
+        if states:
+            self._states = {name: _compile_shadow_list(state_list)
+                            for name, state_list in states.items()}
+            self.boxShadow.prepareShadowLists(list(self._states.values()))
+            if shadow_list is None:
+                self._state = next(iter(states))
+                self.boxShadow.setShadowList(self._states[self._state])
+
         self.disable_margins = True if (disable_margins is True or
                                         margins is not None) else False
 
         if not self.disable_margins:
-            X, Y = self.boxShadow.necessary_indentation()
-            self.mLayout.setContentsMargins(X, Y, X, Y)
+            self.mLayout.setContentsMargins(
+                    *self.boxShadow.necessary_margins())
         elif margins is not None:
             if len(margins) == 2:
                 self.mLayout.setContentsMargins(
@@ -472,8 +2181,407 @@ class BoxShadowWrapper(QtWidgets.QWidget):
     def setShadowList(self, shadow_list: list[dict] = None):
         self.boxShadow.setShadowList(shadow_list)
         if not self.disable_margins:
-            X, Y = self.boxShadow.necessary_indentation()
-            self.mLayout.setContentsMargins(X, Y, X, Y)
+            self.mLayout.setContentsMargins(
+                    *self.boxShadow.necessary_margins())
+
+    def animateTo(self, shadow_list: list[dict] = None, duration: int = 150):
+        # The margins fit both ends of the animation and are kept when it
+        # finishes, so the widget does not jump.
+        self.boxShadow.animateTo(shadow_list, duration)
+        if not self.disable_margins:
+            self.mLayout.setContentsMargins(
+                    *self.boxShadow.necessary_margins())
 
     def setBorder(self, border: int):
         self.boxShadow.setBorder(border)
+
+    def setShape(self, shape: tuple[str, float] = None):
+        self.boxShadow.setShape(shape)
+
+    def setNinePatch(self, nine_patch: bool):
+        self.boxShadow.setNinePatch(nine_patch)
+
+    def setAsynchronous(self, asynchronous: bool):
+        self.boxShadow.setAsynchronous(asynchronous)
+
+    def setShadowScale(self, shadow_scale: float):
+        self.boxShadow.setShadowScale(shadow_scale)
+
+    def setAdaptive(self, adaptive: bool):
+        self.boxShadow.setAdaptive(adaptive)
+
+    def setStates(self, states: dict[str, list[dict]] = None):
+        self._states = {name: _compile_shadow_list(state_list)
+                        for name, state_list in (states or {}).items()}
+        self.boxShadow.prepareShadowLists(list(self._states.values()))
+        if self._state not in self._states:
+            self._state = None
+        if not self.disable_margins:
+            self.mLayout.setContentsMargins(
+                    *self.boxShadow.necessary_margins())
+
+    def setState(self, state: str, duration: int = 0):
+        if state not in self._states:
+            raise ValueError(f"unknown shadow state: {state!r}")
+        self._state = state
+        if duration > 0:
+            self.animateTo(self._states[state], duration)
+        else:
+            self.setShadowList(self._states[state])
+        self._widget.update()
+
+    def state(self):
+        return self._state
+
+
+def _layout_spacing(layout: QtWidgets.QLayout):
+    if isinstance(layout, (QtWidgets.QGridLayout, QtWidgets.QFormLayout)):
+        return layout.horizontalSpacing(), layout.verticalSpacing()
+    return layout.spacing(), layout.spacing()
+
+
+def _set_layout_spacing(layout: QtWidgets.QLayout, horizontal, vertical):
+    if isinstance(layout, (QtWidgets.QGridLayout, QtWidgets.QFormLayout)):
+        layout.setHorizontalSpacing(horizontal)
+        layout.setVerticalSpacing(vertical)
+    elif isinstance(layout, QtWidgets.QBoxLayout):
+        if layout.direction() in (QtWidgets.QBoxLayout.Direction.LeftToRight,
+                                  QtWidgets.QBoxLayout.Direction.RightToLeft):
+            layout.setSpacing(horizontal)
+        else:
+            layout.setSpacing(vertical)
+    else:
+        layout.setSpacing(max(horizontal, vertical))
+
+
+def _member_layouts(widgets):
+    # The layouts (including nested ones) that hold any of widgets, found
+    # in one walk per parent widget.
+    members = set(widgets)
+    layouts = []
+    parents = {widget.parentWidget() for widget in widgets}
+    for parent in parents:
+        if parent is None or parent.layout() is None:
+            continue
+        pending = [parent.layout()]
+        while pending:
+            layout = pending.pop()
+            for index in range(layout.count()):
+                item = layout.itemAt(index)
+                if item.layout() is not None:
+                    pending.append(item.layout())
+                elif item.widget() in members:
+                    layouts.append(layout)
+                    break
+    return layouts
+
+
+class BoxShadowGroup(QtCore.QObject):
+    def __init__(self, shadow_list: list[dict] = None,
+                 border: int = 0, disable_margins: bool = False,
+                 smooth: bool = False, cache_size: int = 64,
+                 shape: tuple[str, float] = None, nine_patch: bool = False,
+                 asynchronous: bool = False, shadow_scale: float = 1,
+                 adaptive: bool = False, parent: QtCore.QObject = None):
+        # One effect per widget, without a wrapper widget or layout around
+        # it. The effects share one compiled shadow list and one cache, and
+        # the spacing and margins of the layouts holding the widgets are
+        # grown to fit the shadows instead.
+        QtCore.QObject.__init__(self, parent)
+        self._shadow_list = _compile_shadow_list(shadow_list or [])
+        self._border = border
+        self._smooth = smooth
+        self._shape = shape
+        self._nine_patch = nine_patch
+        self._asynchronous = asynchronous
+        self._shadow_scale = shadow_scale
+        self._adaptive = adaptive
+        self.disable_margins = disable_margins
+        self._effects = []
+        # Spacing and margins of every layout before the group changed it.
+        self._layouts = {}
+        self._cache = _ShadowCache(shadow_atlas, cache_size)
+        # Held by the connection, as in BoxShadow.
+        self.destroyed.connect(partial(_ShadowCache.clear, self._cache))
+
+    def addWidget(self, widget: QtWidgets.QWidget):
+        self.addWidgets([widget])
+
+    def addWidgets(self, widgets: list[QtWidgets.QWidget]):
+        for widget in widgets:
+            effect = BoxShadow(self._shadow_list, self._border, self._smooth,
+                               0, self._shape, self._nine_patch,
+                               self._asynchronous, self._shadow_scale,
+                               self._adaptive)
+            effect._use_cache(self._cache)
+            effect.destroyed.connect(partial(self._forget, effect))
+            widget.setGraphicsEffect(effect)
+            self._effects.append((widget, effect))
+        self._update_margins(widgets)
+
+    def removeWidget(self, widget: QtWidgets.QWidget):
+        for member, effect in self._effects:
+            if member is widget:
+                self._effects.remove((member, effect))
+                widget.setGraphicsEffect(None)
+                break
+        self._update_margins([widget])
+
+    def widgets(self):
+        return [widget for widget, effect in self._effects]
+
+    def effect(self, widget: QtWidgets.QWidget):
+        for member, effect in self._effects:
+            if member is widget:
+                return effect
+        return None
+
+    def setShadowList(self, shadow_list: list[dict] = None):
+        self._shadow_list = _compile_shadow_list(shadow_list or [])
+        for widget, effect in self._effects:
+            effect.setShadowList(self._shadow_list)
+        self._update_margins(self.widgets())
+
+    def animateTo(self, shadow_list: list[dict] = None, duration: int = 150):
+        self._shadow_list = _compile_shadow_list(shadow_list or [])
+        for widget, effect in self._effects:
+            effect.animateTo(self._shadow_list, duration)
+        self._update_margins(self.widgets())
+
+    def setBorder(self, border: int):
+        self._border = border
+        for widget, effect in self._effects:
+            effect.setBorder(border)
+
+    def setShape(self, shape: tuple[str, float] = None):
+        self._shape = shape
+        for widget, effect in self._effects:
+            effect.setShape(shape)
+
+    def setNinePatch(self, nine_patch: bool):
+        self._nine_patch = nine_patch
+        for widget, effect in self._effects:
+            effect.setNinePatch(nine_patch)
+
+    def setAsynchronous(self, asynchronous: bool):
+        self._asynchronous = asynchronous
+        for widget, effect in self._effects:
+            effect.setAsynchronous(asynchronous)
+
+    def setShadowScale(self, shadow_scale: float):
+        self._shadow_scale = shadow_scale
+        for widget, effect in self._effects:
+            effect.setShadowScale(shadow_scale)
+
+    def setAdaptive(self, adaptive: bool):
+        self._adaptive = adaptive
+        for widget, effect in self._effects:
+            effect.setAdaptive(adaptive)
+
+    def setCacheSize(self, cache_size: int):
+        self._cache.setMaxSize(cache_size)
+
+    def clearCache(self):
+        for widget, effect in self._effects:
+            effect.clearCache()
+
+    def _forget(self, effect, *args):
+        self._effects = [(widget, member) for widget, member in self._effects
+                         if member is not effect]
+
+    def _update_margins(self, widgets):
+        if self.disable_margins:
+            return
+        members = {widget for widget, effect in self._effects}
+        left, top, right, bottom = (self._effects[0][1].necessary_margins()
+                                    if self._effects else (0, 0, 0, 0))
+        for layout in _member_layouts(widgets):
+            if layout not in self._layouts:
+                self._layouts[layout] = (layout.contentsMargins(),
+                                         _layout_spacing(layout))
+            margins, (horizontal, vertical) = self._layouts[layout]
+            if not any(layout.itemAt(index).widget() in members
+                       for index in range(layout.count())):
+                # None of the group is left in it.
+                del self._layouts[layout]
+                layout.setContentsMargins(margins)
+                _set_layout_spacing(layout, horizontal, vertical)
+                continue
+            # Neighbouring widgets need room for the shadows of both.
+            layout.setContentsMargins(max(margins.left(), left),
+                                      max(margins.top(), top),
+                                      max(margins.right(), right),
+                                      max(margins.bottom(), bottom))
+            _set_layout_spacing(layout, max(horizontal, left + right),
+                                max(vertical, top + bottom))
+
+
+def apply_box_shadows(root: QtWidgets.QWidget, selector,
+                      shadow_list: list[dict] = None, **kwargs):
+    # Adds a shadow to every child of root matching selector: a widget
+    # class, a tuple of classes or a function taking the widget. Keyword
+    # arguments are passed to BoxShadowGroup, which is returned and owned
+    # by root.
+    if isinstance(selector, (type, tuple)):
+        classes = selector
+        selector = lambda widget: isinstance(widget, classes)
+    group = BoxShadowGroup(shadow_list, parent=root, **kwargs)
+    group.addWidgets([widget for widget
+                      in root.findChildren(QtWidgets.QWidget)
+                      if selector(widget)])
+    return group
+
+
+def render_box_shadow(source, shadow_list: list[dict] = None,
+                      border: int = 0, smooth: bool = False,
+                      shape: tuple[str, float] = None,
+                      fill=QtGui.QColor(0, 0, 0)):
+    # Renders the shadows of source without a widget and returns them
+    # composited with it. source is a QImage, or the size of a rect (with
+    # the corners of shape) filled with fill. The result is larger by the
+    # reach of the outside shadows, see BoxShadow.necessary_margins().
+    if shape is not None and (len(shape) != 2 or shape[0] != "rounded_rect"):
+        raise ValueError(f"unsupported shape: {shape!r}")
+    shadow_list = _compile_shadow_list(shadow_list or [])
+
+    if isinstance(source, QtGui.QImage):
+        dpr = source.devicePixelRatioF()
+        width, height = source.width(), source.height()
+    else:
+        dpr = 1
+        width, height = (source.width(), source.height()) if isinstance(
+                source, QtCore.QSize) else source
+
+    # Everything below is in pixels, as in BoxShadow.draw().
+    extents = _shadow_extents(shadow_list)
+    left, top, right, bottom = (round(extent * dpr) for extent in extents)
+    image = BoxShadow._new_image(QtCore.QSize(width + left + right,
+                                              height + top + bottom))
+    shadow_profiler.count("painters")
+    painter = QtGui.QPainter(image)
+    painter.setRenderHints(
+            QtGui.QPainter.RenderHint.Antialiasing |
+            QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+    target = QtCore.QRectF(left, top, width, height)
+    if isinstance(source, QtGui.QImage):
+        painter.drawImage(target, source, QtCore.QRectF(source.rect()))
+    else:
+        radius = shape[1] if shape is not None else 0
+        painter.setPen(QtCore.Qt.PenStyle.NoPen)
+        painter.setBrush(QtGui.QColor(fill))
+        painter.drawRoundedRect(target, radius, radius)
+    painter.end()
+
+    shadow_list = _scaled_shadow_list(shadow_list, dpr)
+    if shape is not None:
+        shape_key, margins, context = BoxShadow._rounded_rect_shape(
+                shadow_list, image.width(), image.height(), dpr, extents,
+                shape[1])
+    else:
+        margins, context = None, _RenderContext(image, dpr=dpr)
+    layers = []
+    for inside in (False, True):
+        layer_list = tuple(shadow for shadow in shadow_list
+                           if shadow.inside == inside)
+        layers.append(BoxShadow._render_layer(context, layer_list, inside,
+                                              smooth) if layer_list else None)
+
+    result = BoxShadow._new_image(image.size())
+    shadow_profiler.count("painters")
+    painter = QtGui.QPainter(result)
+    painter.setRenderHints(
+            QtGui.QPainter.RenderHint.Antialiasing |
+            QtGui.QPainter.RenderHint.SmoothPixmapTransform)
+    outside_shadow, inside_shadow = layers
+    if outside_shadow is not None:
+        _draw_nine_slice(painter, result.rect(), outside_shadow, margins)
+    painter.drawImage(0, 0, image)
+    if inside_shadow is not None:
+        border = round(border * dpr)
+        _draw_nine_slice(painter, result.rect().adjusted(
+                                 border, border, -border, -border),
+                         inside_shadow, margins)
+    painter.end()
+    result.setDevicePixelRatio(dpr)
+    return result
+
+
+def _image_state(image: QtGui.QImage):
+    # A QImage as plain values that can be sent to another process.
+    image = image.convertToFormat(
+            QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    return (image.width(), image.height(), image.bytesPerLine(),
+            image.devicePixelRatioF(), _image_bytes(image))
+
+
+def _state_image(state):
+    width, height, bytes_per_line, dpr, data = state
+    image = QtGui.QImage(data, width, height, bytes_per_line,
+                         QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    # The image only wraps data until it is copied.
+    image = image.copy()
+    image.setDevicePixelRatio(dpr)
+    return image
+
+
+def _batch_job_state(job: dict):
+    job = dict(job)
+    if isinstance(job.get("source"), QtGui.QImage):
+        job["source"] = _image_state(job["source"])
+    elif isinstance(job.get("source"), QtCore.QSize):
+        job["source"] = (job["source"].width(), job["source"].height())
+    # Shadows travel as dicts with #AARRGGBB colors.
+    job["shadow_list"] = [
+            {"inside" if shadow.inside else "outside": True,
+             "offset": shadow.offset, "blur": shadow.blur,
+             "color": f"#{shadow.rgba:08x}"}
+            for shadow in _compile_shadow_list(job.get("shadow_list") or [])]
+    if "fill" in job:
+        job["fill"] = QtGui.QColor(job["fill"]).name(
+                QtGui.QColor.NameFormat.HexArgb)
+    return job
+
+
+_batch_application = None
+
+
+def _init_batch_worker(backend: str):
+    global _batch_application
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    if QtWidgets.QApplication.instance() is None:
+        _batch_application = QtWidgets.QApplication([])
+    if backend in _blur_backends:
+        set_blur_backend(backend)
+
+
+def _render_batch_job(job: dict):
+    if isinstance(job["source"], tuple) and len(job["source"]) == 5:
+        job["source"] = _state_image(job["source"])
+    return _image_state(render_box_shadow(**job))
+
+
+def render_box_shadows(jobs, processes: int = None):
+    # Runs render_box_shadow() for every dict of keyword arguments in jobs
+    # in a pool of processes and yields the images in the order of jobs
+    # as soon as they are done. Only a few jobs per process are queued at
+    # a time, so jobs can be a generator of any length.
+    import concurrent.futures
+    import multiprocessing
+
+    processes = processes or os.cpu_count() or 1
+    # Forking a process that runs Qt is not safe, the workers are started
+    # fresh and import this module again.
+    executor = concurrent.futures.ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_batch_worker, initargs=(_blur_backend,))
+    pending = []
+    try:
+        for job in jobs:
+            pending.append(executor.submit(_render_batch_job,
+                                           _batch_job_state(job)))
+            if len(pending) >= processes * 2:
+                yield _state_image(pending.pop(0).result())
+        while pending:
+            yield _state_image(pending.pop(0).result())
+    finally:
+        executor.shutdown(cancel_futures=True)
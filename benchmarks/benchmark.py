@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from itertools import product
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Neumorphism.Neumorphism import *
+from Neumorphism.Neumorphism import QtCore, QtGui, QtWidgets, _RenderContext
+
+
+STAGES = ("_outside_shadow", "_inside_shadow",
+          "_smooth_outside_shadow", "_smooth_inside_shadow")
+
+SIZES = ((50, 30), (200, 120), (600, 400))
+BLURS = (2, 8, 24)
+COUNTS = (1, 2, 4)
+
+QUICK_SIZES = ((50, 30), (200, 120))
+QUICK_BLURS = (8,)
+QUICK_COUNTS = (2,)
+
+STYLE = ("QObject{background: #232428; border: none; border-radius: 5px; "
+         "color: rgb(4, 236, 180);} QPushButton{border-radius: 15px; "
+         "border: 1px solid #1A1A1A; width: 50px; height: 30px}")
+
+
+def shadow_list(count, blur, inside=False):
+    shadows = []
+    for i in range(count):
+        offset = 6 if i % 2 == 0 else -6
+        color = (QtGui.QColor(0, 0, 0, 178) if i % 2 == 0
+                 else QtGui.QColor(58, 58, 58, 255))
+        shadows.append({"inside" if inside else "outside": True,
+                        "offset": [offset, offset], "blur": blur,
+                        "color": color})
+    return shadows
+
+
+def source_image(w, h, pad):
+    image = QtGui.QImage(w + pad * 2, h + pad * 2,
+                         QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QtCore.Qt.GlobalColor.transparent)
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+    painter.setPen(QtCore.Qt.PenStyle.NoPen)
+    painter.setBrush(QtGui.QColor(35, 36, 40))
+    painter.drawRoundedRect(QtCore.QRectF(pad, pad, w, h), 15, 15)
+    painter.end()
+    return image
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    index = min(len(samples) - 1, max(0, round(fraction * (len(samples) - 1))))
+    return samples[index]
+
+
+def measure(function, repeat, warmup=1):
+    for _ in range(warmup):
+        function()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    # Only Python allocations are visible to tracemalloc; Qt's own image
+    # buffers are not counted.
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    function()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sum(max(0, stat.count_diff)
+                 for stat in after.compare_to(before, "filename"))
+
+    return {"repeat": repeat,
+            "mean_ms": sum(samples) / len(samples),
+            "p50_ms": percentile(samples, 0.5),
+            "p90_ms": percentile(samples, 0.9),
+            "p99_ms": percentile(samples, 0.99),
+            "max_ms": max(samples),
+            "allocations": blocks,
+            "peak_bytes": peak}
+
+
+def bench_stages(sizes, blurs, counts, repeat):
+    results = []
+    for (w, h), blur, count, stage in product(sizes, blurs, counts, STAGES):
+        inside = "inside" in stage
+        specs = tuple(ShadowSpec.fromDict(shadow) for shadow in shadow_list(
+                count, blur, inside=inside))
+        pad = max(max(spec.extent) for spec in specs)
+        image = source_image(w, h, int(pad))
+        function = getattr(BoxShadow, stage)
+        result = measure(lambda: function(_RenderContext(image), specs),
+                         repeat)
+        result.update(name=f"{stage} {w}x{h} blur={blur} count={count}",
+                      stage=stage, width=w, height=h, blur=blur, count=count,
+                      smooth=stage.startswith("_smooth"))
+        results.append(result)
+        report(result)
+    return results
+
+
+def bench_draw(sizes, blurs, counts, repeat):
+    results = []
+    for (w, h), blur, count, smooth in product(sizes, blurs, counts,
+                                               (False, True)):
+        widget = QtWidgets.QWidget()
+        widget.setStyleSheet(STYLE)
+        button = QtWidgets.QPushButton("x")
+        button.setFixedSize(w, h)
+        shadows = (shadow_list(count, blur) +
+                   shadow_list(count, blur, inside=True))
+        wrapper = BoxShadowWrapper(button, shadows, border=1, smooth=smooth)
+        layout = QtWidgets.QVBoxLayout(widget)
+        layout.addWidget(wrapper)
+        widget.show()
+        QtWidgets.QApplication.processEvents()
+
+        def cold():
+            wrapper.boxShadow.clearCache()
+            widget.grab()
+
+        for cache, function in (("cold", cold), ("warm", widget.grab)):
+            result = measure(function, repeat)
+            result.update(name=f"draw {cache} {w}x{h} blur={blur} "
+                               f"count={count} smooth={smooth}",
+                          stage="draw", cache=cache, width=w, height=h,
+                          blur=blur, count=count, smooth=smooth)
+            results.append(result)
+            report(result)
+
+        widget.close()
+        widget.deleteLater()
+        QtWidgets.QApplication.processEvents()
+    return results
+
+
+class CalculatorGrid(QtWidgets.QWidget):
+    # The button grid of example.py's Calculator with rows x columns
+    # wrapped buttons, or buttons shadowed by one BoxShadowGroup.
+    def __init__(self, rows, columns, smooth=False, group=False):
+        QtWidgets.QWidget.__init__(self)
+        outside = [{"outside": True, "offset": [6, 6], "blur": 8,
+                    "color": QtGui.QColor(0, 0, 0, 178)},
+                   {"outside": True, "offset": [-6, -6], "blur": 8,
+                    "color": QtGui.QColor(58, 58, 58, 255)}]
+        self.setStyleSheet(STYLE)
+
+        grid = QtWidgets.QGridLayout(self)
+        grid.setSpacing(0)
+        self.wrappers = []
+        self.group = None
+        for row, column in product(range(rows), range(columns)):
+            button = QtWidgets.QPushButton(str(column))
+            if group:
+                grid.addWidget(button, row, column)
+                continue
+            wrapper = BoxShadowWrapper(button, outside, smooth=smooth)
+            grid.addWidget(wrapper, row, column)
+            self.wrappers.append(wrapper)
+        if group:
+            self.group = apply_box_shadows(self, QtWidgets.QPushButton,
+                                           outside, smooth=smooth)
+
+
+def build_calculator(rows, columns, smooth, group):
+    window = CalculatorGrid(rows, columns, smooth, group)
+    window.show()
+    QtWidgets.QApplication.processEvents()
+    window.close()
+    window.deleteLater()
+    QtWidgets.QApplication.sendPostedEvents(
+            None, QtCore.QEvent.Type.DeferredDelete)
+
+
+def bench_calculator(grids, repeat):
+    results = []
+    for (rows, columns), smooth, group in product(grids, (False, True),
+                                                  (False, True)):
+        suffix = " group" if group else ""
+        result = measure(lambda: build_calculator(rows, columns, smooth,
+                                                  group), repeat)
+        result.update(name=f"calculator build {rows}x{columns} "
+                           f"smooth={smooth}{suffix}",
+                      stage="calculator", cache="build", rows=rows,
+                      columns=columns, smooth=smooth, group=group)
+        results.append(result)
+        report(result)
+
+        window = CalculatorGrid(rows, columns, smooth, group)
+        window.show()
+        QtWidgets.QApplication.processEvents()
+
+        def cold():
+            if window.group is not None:
+                window.group.clearCache()
+            for wrapper in window.wrappers:
+                wrapper.boxShadow.clearCache()
+            window.grab()
+
+        for cache, function in (("cold", cold), ("warm", window.grab)):
+            result = measure(function, repeat)
+            result.update(name=f"calculator {cache} {rows}x{columns} "
+                               f"smooth={smooth}{suffix}",
+                          stage="calculator", cache=cache, rows=rows,
+                          columns=columns, smooth=smooth, group=group)
+            results.append(result)
+            report(result)
+
+        window.close()
+        window.deleteLater()
+        QtWidgets.QApplication.processEvents()
+    return results
+
+
+def report(result):
+    print(f"{result['name']:<60} p50 {result['p50_ms']:8.3f} ms  "
+          f"p90 {result['p90_ms']:8.3f} ms  p99 {result['p99_ms']:8.3f} ms  "
+          f"allocs {result['allocations']:6d}", flush=True)
+
+
+def compare(results, baseline, threshold):
+    previous = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None or old["p50_ms"] <= 0:
+            continue
+        ratio = result["p50_ms"] / old["p50_ms"]
+        if ratio > 1 + threshold:
+            regressions.append((result["name"], old["p50_ms"],
+                                result["p50_ms"], ratio))
+    for name, old, new, ratio in regressions:
+        print(f"REGRESSION {name}: {old:.3f} ms -> {new:.3f} ms "
+              f"({ratio:.2f}x)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            description="Benchmark BoxShadow render paths headlessly.")
+    parser.add_argument("--quick", action="store_true",
+                        help="run a reduced sweep")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--backend", default=blur_backend(),
+                        help="blur backend to use")
+    parser.add_argument("--only", choices=("stages", "draw", "calculator"),
+                        action="append", help="run only these groups")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON baseline to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed p50 slowdown before failing")
+    parser.add_argument("--profile",
+                        help="write a shadow_profiler snapshot to this file")
+    args = parser.parse_args(argv)
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    set_blur_backend(args.backend)
+    shadow_profiler.setEnabled(args.profile is not None)
+
+    sizes = QUICK_SIZES if args.quick else SIZES
+    blurs = QUICK_BLURS if args.quick else BLURS
+    counts = QUICK_COUNTS if args.quick else COUNTS
+    grids = ((5, 4),) if args.quick else ((5, 4), (10, 8))
+    groups = args.only or ("stages", "draw", "calculator")
+
+    results = []
+    if "stages" in groups:
+        results += bench_stages(sizes, blurs, counts, args.repeat)
+    if "draw" in groups:
+        results += bench_draw(sizes, blurs, counts, args.repeat)
+    if "calculator" in groups:
+        results += bench_calculator(grids, args.repeat)
+
+    baseline = {"python": platform.python_version(),
+                "qt": QtCore.qVersion(),
+                "platform": app.platformName(),
+                "backend": args.backend,
+                "results": results}
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(baseline, file, indent=2)
+
+    if args.profile:
+        shadow_profiler.dump(args.profile)
+
+    if args.compare:
+        with open(args.compare) as file:
+            if compare(results, json.load(file), args.threshold):
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
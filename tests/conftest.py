@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Neumorphism.Neumorphism import QtCore, QtWidgets
+
+
+@pytest.fixture(scope="session")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def flush(app):
+    # Runs pending deleteLater() calls.
+    def flush():
+        app.sendPostedEvents(None, QtCore.QEvent.Type.DeferredDelete)
+        app.processEvents()
+    return flush
@@ -0,0 +1,130 @@
+import gc
+
+import pytest
+
+from Neumorphism.Neumorphism import (BoxShadowWrapper, QtCore, QtWidgets,
+                                     _blur_backends, _RenderJob,
+                                     apply_box_shadows, set_blur_backend,
+                                     shadow_atlas, shadow_profiler)
+
+SHADOWS = [{"outside": True, "offset": [6, 6], "blur": 8,
+            "color": "#80000000"}]
+
+
+def button(index):
+    widget = QtWidgets.QPushButton(str(index))
+    widget.setFixedSize(50 + index * 10, 30)
+    return widget
+
+
+def test_deleted_wrappers_release_atlas_entries(app, flush):
+    wrappers = [BoxShadowWrapper(button(index), SHADOWS)
+                for index in range(3)]
+    for wrapper in wrappers:
+        wrapper.show()
+        wrapper.grab()
+    assert shadow_atlas.stats()["entries"] == 3
+
+    for wrapper in wrappers:
+        wrapper.deleteLater()
+    del wrappers, wrapper
+    flush()
+    gc.collect()
+    assert shadow_atlas.stats()["entries"] == 0
+    assert shadow_atlas.stats()["bytes"] == 0
+
+
+def test_deleted_window_releases_atlas_entries(app, flush):
+    window = QtWidgets.QWidget()
+    layout = QtWidgets.QHBoxLayout(window)
+    for index in range(3):
+        layout.addWidget(BoxShadowWrapper(button(index), SHADOWS))
+    window.show()
+    window.grab()
+    assert shadow_atlas.stats()["entries"] == 3
+
+    window.deleteLater()
+    del window, layout
+    flush()
+    gc.collect()
+    assert shadow_atlas.stats()["entries"] == 0
+    assert shadow_atlas.stats()["bytes"] == 0
+
+
+def test_deleted_group_releases_atlas_entries(app, flush):
+    window = QtWidgets.QWidget()
+    layout = QtWidgets.QHBoxLayout(window)
+    for index in range(3):
+        layout.addWidget(button(index))
+    apply_box_shadows(window, QtWidgets.QPushButton, SHADOWS)
+    window.show()
+    window.grab()
+    assert shadow_atlas.stats()["entries"] == 3
+
+    window.deleteLater()
+    del window, layout
+    flush()
+    gc.collect()
+    assert shadow_atlas.stats()["entries"] == 0
+    assert shadow_atlas.stats()["bytes"] == 0
+
+
+def test_asynchronous_group_renders_each_layer_once(app, flush):
+    set_blur_backend("numpy")
+    try:
+        window = QtWidgets.QWidget()
+        layout = QtWidgets.QHBoxLayout(window)
+        for index in range(4):
+            widget = QtWidgets.QPushButton("x")
+            widget.setFixedSize(50, 30)
+            layout.addWidget(widget)
+        group = apply_box_shadows(window, QtWidgets.QPushButton, SHADOWS,
+                                  asynchronous=True)
+        window.show()
+        shadow_profiler.reset()
+        shadow_profiler.setEnabled(True)
+        window.grab()
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+        window.grab()
+        shadow_profiler.setEnabled(False)
+
+        assert shadow_profiler.snapshot()["counters"]["pixmaps"] == 1
+        assert shadow_atlas.stats()["entries"] == 1
+        group.clearCache()
+        group._cache.clear()
+        assert shadow_atlas.stats()["entries"] == 0
+    finally:
+        set_blur_backend("scene")
+        window.deleteLater()
+        flush()
+
+
+def test_asynchronous_render_keeps_its_blur_backend(app, flush, monkeypatch):
+    pytest.importorskip("numpy")
+    threads = []
+
+    def scene_blur(image, radius):
+        threads.append(QtCore.QThread.currentThread() is app.thread())
+        return image
+    monkeypatch.setitem(_blur_backends, "scene", (scene_blur, False))
+
+    set_blur_backend("numpy")
+    try:
+        wrapper = BoxShadowWrapper(button(0), SHADOWS, asynchronous=True)
+        wrapper.show()
+        wrapper.grab()
+        set_blur_backend("scene")
+        QtCore.QThreadPool.globalInstance().waitForDone()
+        app.processEvents()
+        assert all(threads)
+    finally:
+        set_blur_backend("scene")
+        wrapper.deleteLater()
+        flush()
+
+
+def test_render_job_refuses_thread_unsafe_backends():
+    with pytest.raises(ValueError):
+        _RenderJob(None, None, None, None, (), False, False,
+                   backend="scene")
@@ -0,0 +1,51 @@
+import pytest
+
+numpy = pytest.importorskip("numpy")
+
+from Neumorphism.Neumorphism import (QtCore, QtGui, _image_array,
+                                     _numpy_blur, _scene_blur,
+                                     _shifted_alpha)
+
+
+def shape_image(shape):
+    image = QtGui.QImage(160, 120,
+                         QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QtCore.Qt.GlobalColor.transparent)
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+    painter.setPen(QtCore.Qt.PenStyle.NoPen)
+    painter.setBrush(QtGui.QColor(40, 40, 40, 200))
+    if shape == "rounded_rect":
+        painter.drawRoundedRect(QtCore.QRectF(40, 30, 80, 60), 15, 15)
+    elif shape == "ellipse":
+        painter.drawEllipse(QtCore.QRectF(50, 30, 60, 60))
+    else:
+        painter.drawRect(QtCore.QRectF(70, 55, 20, 10))
+    painter.end()
+    return image
+
+
+def pixels(image):
+    image = image.convertToFormat(
+            QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    return _image_array(image).astype(numpy.int32)
+
+
+@pytest.mark.parametrize("shape", ["rounded_rect", "ellipse", "rect"])
+@pytest.mark.parametrize("radius", [2, 8, 24])
+def test_numpy_blur_matches_scene_blur(app, shape, radius):
+    image = shape_image(shape)
+    error = numpy.abs(pixels(_numpy_blur(image, radius))
+                      - pixels(_scene_blur(image, radius)))
+    assert error.mean() <= 2
+    assert error.max() <= 48
+
+
+def test_shifted_alpha_moves_coverage_by_fractions_of_a_pixel():
+    alpha = numpy.zeros((4, 4), numpy.uint8)
+    alpha[1, 1] = 200
+    assert _shifted_alpha(alpha, (1, 2))[3, 2] == 200
+    shifted = _shifted_alpha(alpha, (0.5, -0.5))
+    assert shifted[1, 1] == shifted[1, 2] == 50
+    assert shifted[0, 1] == shifted[0, 2] == 50
+    assert shifted.sum() == 200
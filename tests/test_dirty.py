@@ -0,0 +1,80 @@
+import pytest
+
+from Neumorphism.Neumorphism import (BoxShadowWrapper, QtWidgets,
+                                     shadow_profiler)
+
+SHADOWS = [{"outside": True, "offset": [4, 4], "blur": 6,
+            "color": "#000000"},
+           {"inside": True, "offset": [2, 2], "blur": 4,
+            "color": "#80000000"}]
+
+
+@pytest.fixture
+def profiler():
+    shadow_profiler.reset()
+    shadow_profiler.setEnabled(True)
+    yield shadow_profiler
+    shadow_profiler.setEnabled(False)
+    shadow_profiler.reset()
+
+
+def blur_work(profiler):
+    counters = profiler.snapshot()["counters"]
+    return (counters.get("pixels_blurred", 0),
+            counters.get("cache_misses", 0))
+
+
+def label(w=60, h=30):
+    widget = QtWidgets.QLabel("1")
+    widget.setStyleSheet("background: #333; border-radius: 10px; "
+                         "color: white")
+    widget.setFixedSize(w, h)
+    return widget
+
+
+def test_label_text_changes_do_not_blur(app, flush, profiler):
+    widget = label()
+    wrapper = BoxShadowWrapper(widget, SHADOWS)
+    wrapper.show()
+    wrapper.grab()
+    profiler.reset()
+    for text in "23456":
+        widget.setText(text)
+        wrapper.grab()
+    assert blur_work(profiler) == (0, 0)
+    wrapper.deleteLater()
+    flush()
+
+
+def test_nine_patch_resizes_do_not_blur(app, flush, profiler):
+    # Large enough for a uniform middle past the corners and the reach of
+    # the shadows in both directions.
+    widget = label(120, 80)
+    wrapper = BoxShadowWrapper(widget, SHADOWS, nine_patch=True)
+    wrapper.show()
+    wrapper.grab()
+    profiler.reset()
+    for w, h in ((160, 80), (200, 100), (140, 90), (300, 120)):
+        widget.setFixedSize(w, h)
+        wrapper.grab()
+    assert blur_work(profiler) == (0, 0)
+    wrapper.deleteLater()
+    flush()
+
+
+def test_prepared_states_do_not_blur(app, flush, profiler):
+    pressed = [dict(shadow, offset=[1, 1]) for shadow in SHADOWS]
+    wrapper = BoxShadowWrapper(label(), SHADOWS,
+                               states={"normal": SHADOWS,
+                                       "pressed": pressed})
+    wrapper.show()
+    wrapper.grab()
+    # Prepared lists are rendered after the first paint.
+    app.processEvents()
+    profiler.reset()
+    for state in ("pressed", "normal", "pressed"):
+        wrapper.setState(state)
+        wrapper.grab()
+    assert blur_work(profiler) == (0, 0)
+    wrapper.deleteLater()
+    flush()
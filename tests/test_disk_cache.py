@@ -0,0 +1,62 @@
+import os
+
+from Neumorphism import Neumorphism
+from Neumorphism.Neumorphism import QtCore, QtGui, ShadowDiskCache
+
+
+def layer(size=20):
+    image = QtGui.QImage(size, size + 3,
+                         QtGui.QImage.Format.Format_ARGB32_Premultiplied)
+    image.fill(QtCore.Qt.GlobalColor.transparent)
+    painter = QtGui.QPainter(image)
+    painter.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing)
+    painter.setBrush(QtGui.QColor(0, 0, 0, 120))
+    painter.drawEllipse(QtCore.QRectF(2.5, 3, size - 5, size - 3))
+    painter.end()
+    return image
+
+
+def test_stored_layers_load_unchanged(app, tmp_path):
+    cache = ShadowDiskCache()
+    cache.setPath(str(tmp_path))
+    image = layer()
+    cache.store(("layer", 1), image)
+    pixmap = cache.load(("layer", 1))
+    assert pixmap.toImage().convertToFormat(image.format()) == image
+    assert cache.stats()["hits"] == 1
+
+
+def test_damaged_files_are_misses(app, tmp_path):
+    cache = ShadowDiskCache(str(tmp_path))
+    for key in ("truncated", "magic"):
+        cache.store(key, layer())
+    with open(cache._file("truncated"), "r+b") as file:
+        file.truncate(os.path.getsize(cache._file("truncated")) - 1)
+    with open(cache._file("magic"), "r+b") as file:
+        file.write(b"XXXX")
+
+    assert cache.load("truncated") is None
+    assert cache.load("magic") is None
+    assert cache.load("missing") is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_max_bytes_evicts_the_oldest_files(app, tmp_path):
+    cache = ShadowDiskCache(str(tmp_path))
+    keys = ["a", "b", "c"]
+    for index, key in enumerate(keys):
+        cache.store(key, layer())
+        os.utime(cache._file(key), (1000 + index, 1000 + index))
+    size = os.path.getsize(cache._file("a"))
+
+    cache.setMaxBytes(size * 2)
+    assert [os.path.exists(cache._file(key)) for key in keys] == [
+            False, True, True]
+    assert cache.stats()["bytes"] == size * 2
+
+
+def test_file_names_depend_on_the_version(tmp_path, monkeypatch):
+    cache = ShadowDiskCache(str(tmp_path))
+    name = cache._file(("layer", 1))
+    monkeypatch.setattr(Neumorphism, "__version__", "0.0.0")
+    assert cache._file(("layer", 1)) != name
@@ -0,0 +1,11 @@
+from Neumorphism.Neumorphism import ShadowSpec
+
+
+def test_shadow_spec_color_cannot_be_changed():
+    spec = ShadowSpec(False, (6, 6), 8, "#80000000")
+    key, premultiplied = spec.key, spec.premultiplied
+    spec.color.setAlpha(0)
+    assert spec.color.alpha() == 0x80
+    assert spec.color.rgba() == spec.rgba
+    assert spec.key == key
+    assert spec.premultiplied == premultiplied